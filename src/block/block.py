@@ -1,7 +1,9 @@
+import threading
 import time
-from typing import Optional
+from typing import List, Optional
 
 import arcade
+from PIL import ImageStat
 
 from misc.item import Item
 import config
@@ -10,6 +12,8 @@ BREAK_TEXTURES = [arcade.load_texture(path) for path in (config.ASSET_DIR / "ani
 BLOCK_TEXTURES = {
     block_id: arcade.load_texture(config.ASSET_DIR / "sprites" / f"{block_id}.png") for block_id in range(128, 156)
 }
+# Average colour of the sky texture, for drawing the sky without sky blocks
+SKY_COLOR = tuple(int(channel) for channel in ImageStat.Stat(BLOCK_TEXTURES[128].image.convert("RGB")).mean)
 
 
 class Block(arcade.Sprite):
@@ -53,6 +57,17 @@ class Block(arcade.Sprite):
         # self.anim_pos = 0
         # self.orig_texture = self._texture
 
+    def set_block_id(self, block_id: int) -> None:
+        """Turn this sprite into a different block in place, only the texture in its sprite lists changes"""
+        self.texture = BLOCK_TEXTURES[block_id]
+        self.block_id = block_id
+
+    def reset(self, block_id: int, center_x: float, center_y: float) -> None:
+        """Turn this sprite into a different block at a new position, used when recycling blocks"""
+        self.set_block_id(block_id)
+        self.position = center_x, center_y
+        self.visible = True
+
     def hp_set(self, val):
         if val <= 0:
             self.kill()
@@ -105,3 +120,46 @@ class Block(arcade.Sprite):
     # right = property(_get_right, None)
     # top = property(_get_top, None)
     # bottom = property(_get_bottom, None)
+
+
+class BlockPool:
+    """Recycles block sprites instead of creating a new Block for every block that appears"""
+
+    def __init__(self, max_size: int = config.BLOCK_POOL_SIZE):
+        """
+        :param max_size: Most released blocks to keep around, the rest is left to the garbage collector
+        """
+        self.max_size = max_size
+        self._free: List[Block] = []
+        # Chunks are loaded on another thread
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._free)
+
+    def acquire(self, block_id: int, center_x: float, center_y: float) -> Block:
+        """A block sprite at the given position, recycled if possible"""
+        with self._lock:
+            block = self._free.pop() if self._free else None
+        if block is None:
+            return Block(
+                width=config.SPRITE_PIXEL_SIZE,
+                height=config.SPRITE_PIXEL_SIZE,
+                breaking_time=2,
+                hp=2,
+                block_id=block_id,
+                bright=False,
+                center_x=center_x,
+                center_y=center_y)
+        block.reset(block_id, center_x, center_y)
+        return block
+
+    def release(self, block: Block) -> None:
+        """Take a block out of its sprite lists and keep it for reuse"""
+        block.remove_from_sprite_lists()
+        with self._lock:
+            if len(self._free) < self.max_size:
+                self._free.append(block)
+
+
+BLOCK_POOL = BlockPool()
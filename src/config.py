@@ -30,6 +30,20 @@ MUSIC = False
 
 CHUNK_WIDTH = 16
 CHUNK_HEIGHT = 320
+REGION_SIZE = 16  # Chunks per region file
+AUTOSAVE_INTERVAL = 10  # Seconds between folding the edit journal into the region files in the background
+JOURNAL_SYNC_INTERVAL = 1  # Seconds between syncing block edits to the edit journal
+
+TILE_RENDERER = True  # Draw chunks from their block ids on the GPU instead of drawing block sprites
+RENDER_CHUNK_SLOTS = 16  # Chunks the tile renderer draws per draw call
+BLOCK_POOL_SIZE = 20000  # Unused block sprites kept for reuse
+SPRITE_RELEASE_DISTANCE = 4  # Chunks further away from the player than this give their sprites back to the pool
+CHUNK_CACHE_SIZE = 32  # Chunks kept in memory, has to be more than the visible chunks
+SPARSE_SPRITES = True  # Only make sprites for solid blocks next to sky, draw the sky as background
+
+PREFETCH_LOOKAHEAD = 4  # Most chunks requested ahead of the visible chunks in the direction the player moves
+PREFETCH_MARGIN = 1.5  # Prefetch as if chunks took this many times their measured load time
+TIME_SMOOTHING = 0.2  # Weight of the newest sample in smoothed frame and chunk load times
 
 VISIBLE_RANGE_MAX = int((2.5 * CHUNK_WIDTH) / SPRITE_SCALING)
 VISIBLE_RANGE_MIN = int((-2.5 * CHUNK_WIDTH) / SPRITE_SCALING)
@@ -38,3 +52,17 @@ CHUNK_WIDTH_PIXELS = SPRITE_PIXEL_SIZE * CHUNK_WIDTH
 CHUNK_HEIGHT_PIXELS = SPRITE_PIXEL_SIZE * CHUNK_HEIGHT
 
 HEIGHT_MIN = 0
+
+# Chunks generated up front for a new world, everything else is generated when first loaded
+WORLD_MIN_CHUNK = -31
+WORLD_MAX_CHUNK = 31
+
+# Chunk loading pipeline
+CHUNK_LOAD_WORKERS = 2  # Threads reading chunks from storage
+CHUNK_SPRITE_WORKERS = 1  # Threads making block sprites for loaded chunks
+CHUNK_PIPELINE_DEPTH = 4  # Loaded chunks waiting for their sprites
+CHUNK_GEN_WORKERS = 2  # Processes generating chunks that were never saved, one per CPU if None
+CHUNK_FRAME_BUDGET_MS = 4  # Milliseconds per frame spent taking in loaded chunks
+
+WORLD_SEED = None  # Seed for new worlds, random if None
+WORLD_GEN_WORKERS = None  # Processes generating new worlds, one per CPU if None
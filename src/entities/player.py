@@ -8,6 +8,7 @@ import arcade
 
 from entities.entity import Entity
 from misc.inventory import Inventory
+from misc.physics import GridPhysicsEngine
 import config
 
 
@@ -66,11 +67,11 @@ class Player(Entity):
         self.textures = []
         self.textures.append(load_texture(config.ASSET_DIR / "mobs" / f"{image_file}.png",))
         self.textures.append(load_texture(config.ASSET_DIR / "mobs" / f"{image_file}.png", flipped_horizontally=True))
-        self._physics_engine: arcade.PhysicsEnginePlatformer = None
+        self._physics_engine: Optional[GridPhysicsEngine] = None
         self.inventory = Inventory()
 
     @property
-    def physics_engine(self) -> arcade.PhysicsEnginePlatformer:
+    def physics_engine(self) -> GridPhysicsEngine:
         return self._physics_engine
 
     @physics_engine.setter
@@ -78,9 +78,9 @@ class Game(arcade.View):
 
         # Only show the marker when there is a valid block selection.
         self.bx, self.by = world_x, world_y
-        if block and self.world.player.distance_to_block(block) < config.PLAYER_BLOCK_REACH:
+        if block and block.solid and self.world.player.distance_to_block(block) < config.PLAYER_BLOCK_REACH:
             self.b_color = color.GREEN
-        elif block:
+        elif block and block.solid:
             self.b_color = color.WHITE
         else:
             self.b_color = color.RED
@@ -93,11 +93,11 @@ class Game(arcade.View):
 
         if button == MOUSE_BUTTON_LEFT:
             # NOTE: This can be improved later with can_break(block) looking at other game states
-            if block and self.world.block_break_check(block, world_x, world_y):
+            if block and block.solid and self.world.block_break_check(block, world_x, world_y):
                 self.world.remove_block(block)
                 player.inventory.add(Item(True, block.block_id))
         elif button == MOUSE_BUTTON_RIGHT and not self.place_cooldown:
-            if block:
+            if block and block.solid:
                 return
             self.world.place_block(world_x, world_y)
 
@@ -149,13 +149,17 @@ class LoadingScreen(arcade.View):
     def on_draw(self):
         self.window.clear()
         # On frame 0 we render the loading screen so this happens instantly
-        # On frame 1 we crate the game object and the loading iterator
-        # From frame 2 we invoke loading loading steps until done 
+        # On frame 1 we crate the game object, which starts generating the world in the background
+        # From frame 2 we invoke loading loading steps until the chunks around the player are loaded
         if self.frame > 1:
             # Run until all visible chunks are loaded
             self.game_view.world.process_new_chunks()
             self.done_loading, _ = self.game_view.world.update_visible_chunks()
 
+            # The rest of the world keeps generating after the game started
+            progress = self.game_view.world.generation_progress
+            self.text = f"Generating World {progress:.0%}" if progress < 1 else "Loading World"
+
             # Trigger next loading step
             self.angle += 5
 
@@ -279,6 +283,9 @@ def main():
                            resizable=True)
     window.show_view(StartView())
     arcade.run()
+    # Write the edits that were not saved yet
+    if isinstance(window.current_view, Game):
+        window.current_view.world.close()
 
 
 if __name__ == "__main__":
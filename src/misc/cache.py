@@ -0,0 +1,101 @@
+from collections import OrderedDict
+from typing import Container, Dict, Iterator, List, Optional, Set
+
+from misc.chunk import HorizontalChunk
+import config
+
+
+class ChunkCache:
+    """
+    The chunks of a world that are in memory, limited to a number of chunks.
+
+    Chunks are kept in the order they were last visible. Adding a chunk over the limit evicts the chunks
+    that have not been visible for the longest time. Their edits are in the edit journal already.
+    """
+
+    def __init__(self, max_chunks: int = config.CHUNK_CACHE_SIZE):
+        """
+        :param max_chunks: Number of chunks kept in memory
+        """
+        self.max_chunks = max_chunks
+        self._chunks: "OrderedDict[int, HorizontalChunk]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Chunks loaded after a miss that did not come into view yet
+        self._missed: Set[int] = set()
+
+    def __contains__(self, index: int) -> bool:
+        return index in self._chunks
+
+    def __getitem__(self, index: int) -> HorizontalChunk:
+        return self._chunks[index]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._chunks)
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def get(self, index: int) -> Optional[HorizontalChunk]:
+        """Chunk in memory, without counting the access or changing the eviction order"""
+        return self._chunks.get(index)
+
+    def values(self):
+        return self._chunks.values()
+
+    def record_miss(self, index: int) -> None:
+        """Count a chunk that has to be loaded because it is not in memory"""
+        self.misses += 1
+        self._missed.add(index)
+
+    def record_hit(self, index: int) -> None:
+        """Count a chunk coming into view, a hit unless it was loaded after a miss"""
+        if index in self._missed:
+            self._missed.remove(index)
+        else:
+            self.hits += 1
+
+    def touch(self, index: int) -> None:
+        """Mark a chunk as visible, it is evicted last"""
+        if index in self._chunks:
+            self._chunks.move_to_end(index)
+
+    def add(self, chunk: HorizontalChunk, keep: Container[int] = ()) -> List[HorizontalChunk]:
+        """
+        Add a chunk as the most recently visible chunk and evict chunks over the limit.
+
+        :param chunk: The chunk to add
+        :param keep: Indices of chunks that must not be evicted, like the visible chunks
+        :return: The evicted chunks
+        """
+        self._chunks[chunk.index] = chunk
+        self._chunks.move_to_end(chunk.index)
+
+        evicted = []
+        if len(self._chunks) > self.max_chunks:
+            for index in list(self._chunks):
+                if len(self._chunks) - len(evicted) <= self.max_chunks:
+                    break
+                if index == chunk.index or index in keep:
+                    continue
+                evicted.append(self._chunks[index])
+
+        for old_chunk in evicted:
+            self._evict(old_chunk)
+        return evicted
+
+    def _evict(self, chunk: HorizontalChunk) -> None:
+        del self._chunks[chunk.index]
+        self._missed.discard(chunk.index)
+        chunk.release_sprites()
+        self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "chunks": len(self._chunks),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
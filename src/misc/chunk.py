@@ -1,51 +1,83 @@
-from collections import Counter
-from itertools import combinations
-from typing import Any, Dict, Optional
+from functools import cache
+from math import floor
+from typing import Dict, NamedTuple, Optional, Tuple
 
 import arcade
 import numpy as np
 
-from block.block import Block
+from block.block import BLOCK_POOL, Block
+from misc.chunk_data import BlockEdit, ChunkData
 import config
-import utils
 
+# Offsets of the 8 neighbours of a block by compass direction
+NEIGHBOURS: Dict[str, Tuple[int, int]] = {
+    "N": (0, 1), "NE": (1, 1), "E": (1, 0), "SE": (1, -1),
+    "S": (0, -1), "SW": (-1, -1), "W": (-1, 0), "NW": (-1, 1),
+}
+NEIGHBOUR_OFFSETS = np.array(list(NEIGHBOURS.values()))
+NEIGHBOUR_OFFSETS.flags.writeable = False
 
-class HorizontalChunk:
-    COMBINATIONS = (0, 1, -1, 0, 1, -1)
 
-    def __init__(self, x: int, index: int, data: Optional[Dict] = None):
-        """
-        :param int x: x position of the chunk
-        :param int index: File index for this chunk
-        :param data: Chunk data
-        """
-        self.data = data or {}
-        self._block_data = {}
+@cache
+def stencil(radius: int) -> np.ndarray:
+    """(dx, dy) offsets of the blocks at most `radius` blocks away from a block on both axes, without the block"""
+    dx, dy = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    offsets = np.stack([dx.ravel(), dy.ravel()], axis=1)
+    offsets = offsets[(offsets != 0).any(axis=1)]
+    offsets.flags.writeable = False
+    return offsets
 
-        self._index = index
-        self._x = x
-        self.world_x = x * config.SPRITE_PIXEL_SIZE - config.SPRITE_PIXEL_SIZE // 2
-        self._y = 0
-        self._chunks = 0
 
-        self._blocks = arcade.SpriteList(use_spatial_hash=True, lazy=True)
-        self._bg_blocks = arcade.SpriteList(use_spatial_hash=True, lazy=True)
+def world_to_tile(x: float, y: float) -> Tuple[int, int]:
+    """Tile position of the block covering a world position, blocks are centered on multiples of the block size"""
+    half = config.SPRITE_PIXEL_SIZE / 2
+    return floor((x + half) / config.SPRITE_PIXEL_SIZE), floor((y + half) / config.SPRITE_PIXEL_SIZE)
 
-        self.bg_block_count = 0
-        self.other_block_count = 0
 
-        self.biomes = {}
+class BlockAt(NamedTuple):
+    """A block read from chunk storage, on either layer"""
+    chunk: "HorizontalChunk"
+    x: int
+    y: int
+    block_id: int
+    sprite: Optional[Block]
 
     @property
-    def x(self) -> int:
-        return self._x
+    def tile_x(self) -> int:
+        return self.chunk.x + self.x
 
     @property
-    def index(self) -> int:
-        return self._index
+    def center_x(self) -> int:
+        return self.tile_x * config.SPRITE_PIXEL_SIZE
 
     @property
-    def spritelist(self) -> arcade.SpriteList:
+    def center_y(self) -> int:
+        return self.y * config.SPRITE_PIXEL_SIZE
+
+    @property
+    def solid(self) -> bool:
+        return self.block_id > 129
+
+
+class HorizontalChunk(ChunkData):
+    def __init__(self, x: int, index: int, data: Optional[np.ndarray] = None):
+        """
+        :param int x: x position of the chunk
+        :param int index: File index for this chunk
+        :param data: Chunk data, a (CHUNK_WIDTH, CHUNK_HEIGHT) array of block ids indexed by [x, y]
+        """
+        super().__init__(x, index, data)
+        # Block sprites, same layout as data, and the lists drawing them. None until make_sprite_list runs,
+        # chunks drawn by the tile renderer never need them.
+        self._block_data: Optional[np.ndarray] = None
+        self._blocks: Optional[arcade.SpriteList] = None
+        self._bg_blocks: Optional[arcade.SpriteList] = None
+        self.has_sprites = False
+
+        self.world_x = x * config.SPRITE_PIXEL_SIZE - config.SPRITE_PIXEL_SIZE // 2
+
+    @property
+    def spritelist(self) -> Optional[arcade.SpriteList]:
         return self._blocks
 
     def is_visible(self, x_pos: float, max_dist: float) -> bool:
@@ -66,120 +98,140 @@ class HorizontalChunk:
         # Otherwise we have a visible chunk
         return True
 
-    def make_sprite_list(self):
-        for (x_inc, y_inc), block_id in self.data.items():
-            # HACK: Remove air blocks for now. No longer the hack is needed.
-            cx = (self._x + x_inc) * config.SPRITE_PIXEL_SIZE
-            cy = y_inc * config.SPRITE_PIXEL_SIZE
-            block = Block(
-                width=config.SPRITE_PIXEL_SIZE,
-                height=config.SPRITE_PIXEL_SIZE,
-                breaking_time=2,
-                hp=2,
-                block_id=block_id,
-                bright=False,
-                center_x=cx,
-                center_y=cy)
-
-            self._block_data[(x_inc, y_inc)] = block
-
-            if block_id > 129:
-                self._blocks.append(block)
-            else:
-                self._bg_blocks.append(block)
+    def exposed_blocks(self) -> np.ndarray:
+        """Mask of solid blocks next to a non solid block. Blocks on the chunk border count as exposed."""
+        solid = self.data > 129
+        enclosed = np.zeros_like(solid)
+        enclosed[1:-1, 1:-1] = solid[:-2, 1:-1] & solid[2:, 1:-1] & solid[1:-1, :-2] & solid[1:-1, 2:]
+        return solid & ~enclosed
 
+    def make_sprite_list(self):
+        if config.SPARSE_SPRITES:
+            # Sky and buried blocks can't be seen or touched, they only exist in data
+            positions = zip(*np.nonzero(self.exposed_blocks()))
+        else:
+            positions = np.ndindex(self.data.shape)
+
+        if self._block_data is None:
+            self._block_data = np.empty(self.data.shape, dtype=object)
+            self._blocks, self._bg_blocks = self._new_sprite_lists()
+        for x_inc, y_inc in positions:
+            self._materialize(x_inc, y_inc)
             yield
+        self.has_sprites = True
 
-    def __getitem__(self, key: int):
-        return self.data[key]
-
-    def __setitem__(self, _: Any, value: utils.TArray):
-        self._chunks += 1
-        for y_row in np.flip(value.arr):
-            for x_inc, block_ in enumerate(y_row):
-                if block_ > 129:
-                    self.other_block_count += 1
-                else:
-                    self.bg_block_count += 1
-                self.data[x_inc, self._y] = block_
-            self._y += 1
-        c = Counter(self.biomes)
-        c.update(value.adv_info)
-        self.biomes = dict(c)
-
-    def __iter__(self):
-        return self.data.__iter__()
-
-    def __repr__(self):
-        return f"Chunk[{self.index}]"
+    def initialize_sprites(self):
+        """Create the GL resources of the sprite lists now instead of on the first draw. Main thread only."""
+        if self._blocks is None:
+            return
+        self._blocks.initialize()
+        self._bg_blocks.initialize()
+
+    @staticmethod
+    def _new_sprite_lists() -> Tuple[arcade.SpriteList, arcade.SpriteList]:
+        # Lazy, so sprites can be added on the loader threads before the lists are drawn
+        return (
+            arcade.SpriteList(use_spatial_hash=False, lazy=True),
+            arcade.SpriteList(use_spatial_hash=False, lazy=True),
+        )
+
+    def release_sprites(self):
+        """Give all block sprites back to the pool and drop the lists, make_sprite_list creates them again"""
+        if self._block_data is None:
+            return
+        # Unlinking the sprites first is linear, removing them one by one would be quadratic. The lists are
+        # dropped instead of cleared, clearing a drawn list allocates new GL buffers for it on this thread.
+        for sprite_list in (self._blocks, self._bg_blocks):
+            for block in sprite_list:
+                block.sprite_lists.remove(sprite_list)
+        for block in self._block_data.flat:
+            if block is not None:
+                BLOCK_POOL.release(block)
+        self._block_data = None
+        self._blocks = self._bg_blocks = None
+        self.has_sprites = False
+
+    def block_at(self, x: int, y: int) -> BlockAt:
+        """The block at an [x, y] index in this chunk, with its sprite if it has one"""
+        sprite = self._block_data[x, y] if self._block_data is not None else None
+        return BlockAt(self, x, y, int(self.data[x, y]), sprite)
 
     def draw(self):
+        if self._blocks is None:
+            return
         self._blocks.draw(pixelated=True)
         self._bg_blocks.draw(pixelated=True)
 
-    def remove(self, block: Block):
-        block.remove_from_sprite_lists()
-        self._block_remove(block.center_x, block.center_y)
-
-        new_block = Block(
-            width=config.SPRITE_PIXEL_SIZE,
-            height=config.SPRITE_PIXEL_SIZE,
-            breaking_time=2,
-            hp=2,
-            block_id=128,
-            bright=False,
-            center_x=block.center_x,
-            center_y=block.center_y
+    def remove(self, x: int, y: int) -> BlockEdit:
+        """Replace the block at an [x, y] index in this chunk with sky"""
+        return self._set_block(x, y, 128)
+
+    def add(self, center_x, center_y, block_id) -> Optional[BlockEdit]:
+        x, y = self._local_position(center_x, center_y)
+        if self.data[x, y] > 129:
+            return None
+        return self._set_block(x, y, block_id)
+
+    @staticmethod
+    def _local_position(x: float, y: float) -> Tuple[int, int]:
+        """Convert a block's world position to its [x, y] index in this chunk"""
+        return (int(x // config.SPRITE_PIXEL_SIZE) % config.CHUNK_WIDTH,
+                int(y // config.SPRITE_PIXEL_SIZE) % config.CHUNK_HEIGHT)
+
+    def _is_exposed(self, x: int, y: int) -> bool:
+        if self.data[x, y] <= 129:
+            return False
+        if x in (0, config.CHUNK_WIDTH - 1) or y in (0, config.CHUNK_HEIGHT - 1):
+            return True
+        return bool(
+            self.data[x - 1, y] <= 129 or self.data[x + 1, y] <= 129 or
+            self.data[x, y - 1] <= 129 or self.data[x, y + 1] <= 129
         )
-        self._bg_blocks.append(new_block)
-        self._block_add(new_block)
 
-    def add(self, center_x, center_y, block_id):
-        block = self._block_data.get((center_x // config.SPRITE_PIXEL_SIZE, center_y // config.SPRITE_PIXEL_SIZE))
-        if not block:
+    def _set_block(self, x: int, y: int, block_id: int) -> BlockEdit:
+        """Change a block and update the sprites around it that changed"""
+        edit = super()._set_block(x, y, block_id)
+
+        # Chunks without sprites get them from data in make_sprite_list
+        if not self.has_sprites:
+            return edit
+        if not config.SPARSE_SPRITES:
+            self._update_sprite(x, y)
+            return edit
+
+        # Breaking or placing a block can expose or bury its neighbours
+        for nx, ny in ((x, y), (x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if 0 <= nx < config.CHUNK_WIDTH and 0 <= ny < config.CHUNK_HEIGHT:
+                self._update_sprite(nx, ny)
+        return edit
+
+    def _update_sprite(self, x: int, y: int):
+        """
+        Bring the sprite of a block in line with data, changing an existing sprite in place.
+        Sprites never leave their list, removing one is linear in the size of the list. A sprite of a block that
+        doesn't need one anymore is hidden, it shows again when the block does.
+        """
+        block = self._block_data[x, y]
+        visible = self._is_exposed(x, y) if config.SPARSE_SPRITES else True
+        if block is None:
+            if visible:
+                self._materialize(x, y)
             return
-        block.remove_from_sprite_lists()
-        self._block_remove(center_x, center_y)
-
-        new_block = Block(
-            width=config.SPRITE_PIXEL_SIZE,
-            height=config.SPRITE_PIXEL_SIZE,
-            breaking_time=2,
-            hp=2,
-            block_id=block_id,
-            bright=False,
-            center_x=center_x,
-            center_y=center_y
-        )
-        self._blocks.append(new_block)
-        self._block_add(new_block)
-
-    def get_neighbouring_blocks(self, block: Block) -> Dict[str, Optional[Block]]:
-        bx, by = (block.center_x // config.SPRITE_PIXEL_SIZE) % config.CHUNK_WIDTH, (block.center_y //
-                                                                                     config.SPRITE_PIXEL_SIZE) %\
-                 config.CHUNK_HEIGHT
-
-        y_dict = {1: "N", 0: "", -1: "S"}
-        x_dict = {1: "E", 0: "", -1: "W"}
-        # sets remove duplicate values.
-        unique_combs = set(combinations(self.COMBINATIONS, 2))
-        ret = {}
-        for x, y in unique_combs:
-            direction = y_dict[y] + x_dict[x]
-            ret[direction] = [None if self.data.get((bx + x, by + y)) in (128, 129) else
-                              self.data.get((bx + x, by + y))][0]
-        return ret
-
-    def _block_add(self, new_block: Block):
-        key_ = ((new_block.center_x // config.SPRITE_PIXEL_SIZE) % config.CHUNK_WIDTH, (new_block.center_y //
-                                                                                        config.SPRITE_PIXEL_SIZE) %
-                config.CHUNK_HEIGHT)
-        self.data[key_] = new_block.block_id
-        self._block_data[key_] = new_block
-
-    def _block_remove(self, x: int, y: int):
-        key_ = ((x // config.SPRITE_PIXEL_SIZE) % config.CHUNK_WIDTH, (y //
-                                                                       config.SPRITE_PIXEL_SIZE) %
-                config.CHUNK_HEIGHT)
-        del (self.data[key_])
-        del (self._block_data[key_])
+
+        block_id = int(self.data[x, y])
+        if block.block_id != block_id:
+            block.set_block_id(block_id)
+        if block.visible != visible:
+            block.visible = visible
+
+    def _materialize(self, x: int, y: int):
+        """Create the sprite for a block"""
+        block_id = int(self.data[x, y])
+        block = BLOCK_POOL.acquire(block_id, (self._x + x) * config.SPRITE_PIXEL_SIZE, y * config.SPRITE_PIXEL_SIZE)
+
+        self._block_data[x, y] = block
+
+        if block_id > 129:
+            self._blocks.append(block)
+        else:
+            self._bg_blocks.append(block)
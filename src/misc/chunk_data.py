@@ -0,0 +1,99 @@
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+import config
+import utils
+
+
+class BlockEdit(NamedTuple):
+    """A block change in a chunk"""
+    chunk: int
+    x: int
+    y: int
+    old: int
+    new: int
+
+
+class ChunkData:
+    """
+    The blocks of a chunk without anything to draw them, all that storage and world generation need.
+    See misc.chunk.HorizontalChunk for the chunks of a world in the game.
+    """
+
+    def __init__(self, x: int, index: int, data: Optional[np.ndarray] = None):
+        """
+        :param int x: x position of the chunk
+        :param int index: File index for this chunk
+        :param data: Chunk data, a (CHUNK_WIDTH, CHUNK_HEIGHT) array of block ids indexed by [x, y]
+        """
+        if data is None:
+            data = np.full((config.CHUNK_WIDTH, config.CHUNK_HEIGHT), 128, dtype=np.uint8)
+        self.data: np.ndarray = data
+
+        self._index = index
+        self._x = x
+        self._y = 0
+        self._chunks = 0
+
+        self.biomes = {}
+        # Bumped on every change to data, lets renderers tell when to upload the chunk again
+        self.revision = 0
+
+    @classmethod
+    def from_column(cls, index: int, column: Dict[Tuple[int, ...], utils.TArray]) -> "ChunkData":
+        """Create a chunk from a generated terrain column, see misc.terrain.gen_column"""
+        chunk = cls(index * config.CHUNK_WIDTH, index)
+        for tile in column.values():
+            chunk['setter'] = tile
+        return chunk
+
+    @property
+    def x(self) -> int:
+        return self._x
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def bg_block_count(self) -> int:
+        """Number of background (sky and cloud) blocks"""
+        return self.data.size - self.other_block_count
+
+    @property
+    def other_block_count(self) -> int:
+        """Number of solid blocks"""
+        return int(np.count_nonzero(self.data > 129))
+
+    def __getitem__(self, key: Tuple[int, int]):
+        return self.data[key]
+
+    def __setitem__(self, _: Any, value: utils.TArray):
+        """Append a 16 x 16 terrain tile on top of the blocks ingested so far"""
+        self._chunks += 1
+        # Tiles are stored top row first, the chunk is indexed [x, y] from the bottom up
+        tile = np.flip(value.arr).T
+        self.data[:, self._y:self._y + tile.shape[1]] = tile
+        self._y += tile.shape[1]
+        self.revision += 1
+        for key, biome in value.adv_info.items():
+            self.biomes[key] = self.biomes.get(key, 0) + biome
+
+    def __iter__(self):
+        return np.ndindex(self.data.shape)
+
+    def __repr__(self):
+        return f"Chunk[{self.index}]"
+
+    def replay(self, edits: Iterable[BlockEdit]):
+        """Apply recorded edits in order"""
+        for edit in edits:
+            self._set_block(edit.x, edit.y, edit.new)
+
+    def _set_block(self, x: int, y: int, block_id: int) -> BlockEdit:
+        """Change a block"""
+        edit = BlockEdit(self.index, x, y, int(self.data[x, y]), block_id)
+        self.data[x, y] = block_id
+        self.revision += 1
+        return edit
@@ -0,0 +1,104 @@
+from math import ceil, floor
+from typing import Callable, Tuple
+
+import arcade
+
+import config
+
+# Keeps a sprite resting exactly on a block edge from counting as overlapping the block
+EDGE_TOLERANCE = 0.01
+
+
+def tile_range(low: float, high: float) -> Tuple[int, int]:
+    """First and last tile overlapped by the world coordinates [low, high). Blocks are centered on the tiles."""
+    half = config.SPRITE_PIXEL_SIZE / 2
+    return (
+        floor((low + half) / config.SPRITE_PIXEL_SIZE),
+        ceil((high + half) / config.SPRITE_PIXEL_SIZE) - 1,
+    )
+
+
+class GridPhysicsEngine:
+    """
+    Platformer physics resolving a sprite's hit box against the block grid.
+
+    Instead of testing the sprite against block sprites, every step only looks up the tiles the sprite's
+    bounding box moves into, so the cost does not depend on how many blocks are loaded.
+    """
+
+    def __init__(self, sprite: arcade.Sprite, is_solid: Callable[[int, int], bool],
+                 gravity_constant: float = 0.5):
+        """
+        :param sprite: The moving sprite
+        :param is_solid: Whether the block at a tile position can't be moved through
+        :param gravity_constant: Downward acceleration per frame
+        """
+        self.sprite = sprite
+        self.is_solid = is_solid
+        self.gravity_constant = gravity_constant
+
+    def _bounds(self) -> Tuple[float, float, float, float]:
+        sprite = self.sprite
+        return sprite.left, sprite.right, sprite.bottom, sprite.top
+
+    def _solid_in(self, x_tiles: Tuple[int, int], y_tiles: Tuple[int, int]) -> bool:
+        return any(
+            self.is_solid(x, y)
+            for x in range(x_tiles[0], x_tiles[1] + 1)
+            for y in range(y_tiles[0], y_tiles[1] + 1)
+        )
+
+    def can_jump(self, y_distance: float = 5) -> bool:
+        """Whether there is a solid block less than `y_distance` below the sprite"""
+        left, right, bottom, _ = self._bounds()
+        x_tiles = tile_range(left + EDGE_TOLERANCE, right - EDGE_TOLERANCE)
+        return self._solid_in(x_tiles, tile_range(bottom - y_distance, bottom))
+
+    def update(self) -> None:
+        """Apply gravity and move the sprite, stopping it at the first solid block on each axis"""
+        sprite = self.sprite
+        sprite.change_y -= self.gravity_constant
+        size = config.SPRITE_PIXEL_SIZE
+        half = size / 2
+
+        left, right, bottom, top = self._bounds()
+
+        # Vertical movement, checking the rows the sprite moves into one at a time
+        if sprite.change_y:
+            x_tiles = tile_range(left + EDGE_TOLERANCE, right - EDGE_TOLERANCE)
+            offset = sprite.change_y
+            if offset < 0:
+                first, last = tile_range(bottom + offset, bottom)
+                for row in range(last, first - 1, -1):
+                    if self._solid_in(x_tiles, (row, row)):
+                        offset = row * size + half - bottom
+                        sprite.change_y = 0
+                        break
+            else:
+                first, last = tile_range(top, top + offset)
+                for row in range(first, last + 1):
+                    if self._solid_in(x_tiles, (row, row)):
+                        offset = row * size - half - top
+                        sprite.change_y = 0
+                        break
+            sprite.center_y += offset
+            bottom += offset
+            top += offset
+
+        # Horizontal movement, checking the columns the sprite moves into one at a time
+        if sprite.change_x:
+            y_tiles = tile_range(bottom + EDGE_TOLERANCE, top - EDGE_TOLERANCE)
+            offset = sprite.change_x
+            if offset < 0:
+                first, last = tile_range(left + offset, left)
+                for column in range(last, first - 1, -1):
+                    if self._solid_in((column, column), y_tiles):
+                        offset = column * size + half - left
+                        break
+            else:
+                first, last = tile_range(right, right + offset)
+                for column in range(first, last + 1):
+                    if self._solid_in((column, column), y_tiles):
+                        offset = column * size - half - right
+                        break
+            sprite.center_x += offset
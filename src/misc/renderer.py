@@ -0,0 +1,146 @@
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+import arcade
+from arcade.gl import BufferDescription
+import numpy as np
+
+from block.block import BLOCK_TEXTURES
+from misc.chunk import HorizontalChunk
+import config
+
+VERTEX_SHADER = """
+#version 330
+
+uniform Projection {
+    uniform mat4 matrix;
+} proj;
+
+in vec2 in_vert;
+out vec2 v_world;
+
+void main() {
+    gl_Position = proj.matrix * vec4(in_vert, 0.0, 1.0);
+    v_world = in_vert;
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 330
+
+uniform sampler2D atlas;
+uniform usampler2D blocks;
+uniform int slots;
+uniform int chunk_width;
+uniform int chunk_height;
+uniform float tile_size;
+uniform uint first_block;
+uniform float atlas_tiles;
+
+in vec2 v_world;
+out vec4 fragColor;
+
+void main() {
+    // Blocks are centered on multiples of the tile size
+    vec2 tile_pos = v_world / tile_size + 0.5;
+    ivec2 tile = ivec2(floor(tile_pos));
+    if (tile.y < 0 || tile.y >= chunk_height) discard;
+
+    int chunk = int(floor(float(tile.x) / float(chunk_width)));
+    int slot = int(mod(float(chunk), float(slots)));
+    ivec2 texel = ivec2(slot * chunk_width + tile.x - chunk * chunk_width, tile.y);
+    uint block_id = texelFetch(blocks, texel, 0).r;
+    // Slots that never got a chunk are zero
+    if (block_id < first_block) discard;
+
+    vec2 uv = vec2((float(block_id - first_block) + fract(tile_pos.x)) / atlas_tiles, fract(tile_pos.y));
+    fragColor = texture(atlas, uv);
+}
+"""
+
+
+class TileRenderer:
+    """
+    Draws chunks from their block ids in one draw call, without any per block sprites.
+
+    Each chunk's block array is uploaded into a slot of a block id texture the first time it is drawn
+    and again after it is edited. The fragment shader looks the block id up for every pixel and samples
+    the block's texture from an atlas of all block textures.
+    """
+
+    def __init__(self, ctx: arcade.ArcadeContext, slots: int = config.RENDER_CHUNK_SLOTS):
+        """
+        :param ctx: The window's context
+        :param slots: Number of chunks that can be drawn in one draw call
+        """
+        self.ctx = ctx
+        self.slots = slots
+        self._first_block = min(BLOCK_TEXTURES)
+
+        self._atlas = self._make_atlas()
+        self._blocks = ctx.texture((config.CHUNK_WIDTH * slots, config.CHUNK_HEIGHT), components=1, dtype="u1")
+        # (chunk, revision) uploaded to each slot
+        self._uploaded: List[Optional[Tuple[HorizontalChunk, int]]] = [None] * slots
+
+        self._program = ctx.program(vertex_shader=VERTEX_SHADER, fragment_shader=FRAGMENT_SHADER)
+        self._program["atlas"] = 0
+        self._program["blocks"] = 1
+        self._program["slots"] = slots
+        self._program["chunk_width"] = config.CHUNK_WIDTH
+        self._program["chunk_height"] = config.CHUNK_HEIGHT
+        self._program["tile_size"] = config.SPRITE_PIXEL_SIZE
+        self._program["first_block"] = self._first_block
+        self._program["atlas_tiles"] = len(BLOCK_TEXTURES)
+
+        self._quad = ctx.buffer(reserve=4 * 2 * 4, usage="dynamic")
+        self._geometry = ctx.geometry([BufferDescription(self._quad, "2f", ["in_vert"])],
+                                      mode=ctx.TRIANGLE_STRIP)
+
+    def _make_atlas(self) -> arcade.gl.Texture:
+        # One row of block textures ordered by block id, flipped since textures start at the bottom row
+        size = config.SPRITE_PIXEL_SIZE
+        images = [
+            np.asarray(BLOCK_TEXTURES[block_id].image.convert("RGBA").resize((size, size)))
+            for block_id in sorted(BLOCK_TEXTURES)
+        ]
+        atlas = np.ascontiguousarray(np.flipud(np.hstack(images)))
+        return self.ctx.texture((atlas.shape[1], atlas.shape[0]), components=4, data=atlas.tobytes(),
+                                filter=(self.ctx.NEAREST, self.ctx.NEAREST))
+
+    def upload(self, chunk: HorizontalChunk) -> None:
+        """Write a chunk to its slot if it is not there already, draw does this for chunks that are not"""
+        slot = chunk.index % self.slots
+        uploaded = self._uploaded[slot]
+        if uploaded and uploaded[0] is chunk and uploaded[1] == chunk.revision:
+            return
+        # The texture is indexed [y, x], the chunk [x, y]
+        self._blocks.write(np.ascontiguousarray(chunk.data.T).tobytes(),
+                           viewport=(slot * config.CHUNK_WIDTH, 0, config.CHUNK_WIDTH, config.CHUNK_HEIGHT))
+        self._uploaded[slot] = chunk, chunk.revision
+
+    def release(self, chunk: HorizontalChunk) -> None:
+        """Forget a chunk that is no longer in memory, its slot is written again by the next chunk drawn in it"""
+        slot = chunk.index % self.slots
+        uploaded = self._uploaded[slot]
+        if uploaded and uploaded[0] is chunk:
+            self._uploaded[slot] = None
+
+    def draw(self, chunks: Sequence[HorizontalChunk]) -> None:
+        """Draw a row of consecutive chunks"""
+        chunks = list(chunks)
+        # Leaves and other partly transparent blocks show the background through
+        self.ctx.enable(self.ctx.BLEND)
+        self._atlas.use(0)
+        self._blocks.use(1)
+        # Every slot holds one chunk, so draw at most that many chunks at a time
+        for i in range(0, len(chunks), self.slots):
+            group = chunks[i:i + self.slots]
+            for chunk in group:
+                self.upload(chunk)
+
+            left = group[0].world_x
+            right = group[-1].world_x + config.CHUNK_WIDTH_PIXELS
+            bottom = -config.SPRITE_PIXEL_SIZE / 2
+            top = bottom + config.CHUNK_HEIGHT_PIXELS
+            self._quad.write(array("f", (left, bottom, right, bottom, left, top, right, top)))
+            self._geometry.render(self._program)
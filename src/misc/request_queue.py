@@ -0,0 +1,113 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import config
+
+
+class ChunkRequest:
+    """A queued chunk request and its timings"""
+
+    __slots__ = ("chunk_id", "item", "priority", "queued_at", "started_at", "finished_at")
+
+    def __init__(self, chunk_id: int, item: Any, priority: float):
+        """
+        :param chunk_id: Index of the requested chunk
+        :param item: What the worker gets, a chunk id or a chunk
+        :param priority: Lower is served first
+        """
+        self.chunk_id = chunk_id
+        self.item = item
+        self.priority = priority
+        self.queued_at = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def wait_time(self) -> Optional[float]:
+        """Seconds the request waited in the queue"""
+        return None if self.started_at is None else self.started_at - self.queued_at
+
+    @property
+    def service_time(self) -> Optional[float]:
+        """Seconds from leaving the queue until done"""
+        return None if self.finished_at is None else self.finished_at - self.started_at
+
+
+class ChunkRequestQueue:
+    """
+    Thread safe queue of chunk requests served lowest priority first, like the distance to the player.
+
+    There is at most one request per chunk, requesting a queued chunk again updates the request.
+    Requests can be cancelled and re-prioritized while they are queued.
+    """
+
+    def __init__(self):
+        self._requests: Dict[int, ChunkRequest] = {}
+        self._condition = threading.Condition()
+
+        self.served = 0
+        self.cancelled = 0
+        # Smoothed seconds spent waiting and being served
+        self.wait_time = 0.0
+        self.service_time = 0.05
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return chunk_id in self._requests
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def put(self, chunk_id: int, item: Any, priority: float = 0) -> None:
+        """Queue a request, replacing a queued request for the same chunk"""
+        with self._condition:
+            request = self._requests.get(chunk_id)
+            if request is None:
+                self._requests[chunk_id] = ChunkRequest(chunk_id, item, priority)
+            else:
+                request.item = item
+                request.priority = priority
+            self._condition.notify()
+
+    def cancel(self, chunk_id: int) -> bool:
+        """Drop a queued request, False if it is not queued (anymore)"""
+        with self._condition:
+            if self._requests.pop(chunk_id, None) is None:
+                return False
+            self.cancelled += 1
+            return True
+
+    def reprioritize(self, priority: Callable[[int], float]) -> None:
+        """Set the priority of every queued request from its chunk id"""
+        with self._condition:
+            for request in self._requests.values():
+                request.priority = priority(request.chunk_id)
+
+    def get(self) -> ChunkRequest:
+        """Wait for and take the request with the lowest priority"""
+        with self._condition:
+            while not self._requests:
+                self._condition.wait()
+            # Only a handful of chunks are ever queued, a scan is cheaper than keeping a heap up to date
+            request = min(self._requests.values(), key=lambda r: r.priority)
+            del self._requests[request.chunk_id]
+            request.started_at = time.perf_counter()
+            self.wait_time += config.TIME_SMOOTHING * (request.wait_time - self.wait_time)
+        return request
+
+    def done(self, request: ChunkRequest) -> None:
+        """Record that a request taken with get is served"""
+        request.finished_at = time.perf_counter()
+        with self._condition:
+            self.served += 1
+            self.service_time += config.TIME_SMOOTHING * (request.service_time - self.service_time)
+
+    def stats(self) -> Dict[str, float]:
+        with self._condition:
+            return {
+                "queued": len(self._requests),
+                "served": self.served,
+                "cancelled": self.cancelled,
+                "wait_time": self.wait_time,
+                "service_time": self.service_time,
+            }
@@ -0,0 +1,453 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+import numpy as np
+
+from misc.chunk_data import BlockEdit, ChunkData
+import config
+
+# Chunk layout (little endian):
+#   header  - magic, format version, width, height, number of biome entries, chunk index, crc32 of the payload
+#   payload - width * height block ids as uint8 in [x, y] order,
+#             followed by one (y_max, y_min, biome) int32 triplet per biome entry
+CHUNK_MAGIC = b"NHSC"
+CHUNK_VERSION = 1
+CHUNK_HEADER = struct.Struct("<4sHHHHiI")
+
+# Region layout (little endian):
+#   header - magic, format version, number of chunk slots
+#   table  - one (offset, length) uint32 pair per slot, offset 0 marks a missing chunk
+#   chunks - packed chunks at the offsets from the table, in any order and with gaps left by rewrites
+REGION_MAGIC = b"NHSR"
+REGION_VERSION = 1
+REGION_HEADER = struct.Struct("<4sHH")
+REGION_ENTRY = struct.Struct("<II")
+
+# Journal layout (little endian):
+#   header  - magic, format version
+#   records - one (chunk index, x, y, old block id, new block id) record per block edit, appended in edit order
+JOURNAL_MAGIC = b"NHSJ"
+JOURNAL_VERSION = 1
+JOURNAL_HEADER = struct.Struct("<4sH")
+JOURNAL_RECORD = struct.Struct("<iHHBB")
+
+BLOCK_DTYPE = np.uint8
+BIOME_DTYPE = np.dtype("<i4")
+
+
+class ChunkFormatError(Exception):
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"Invalid chunk data: {reason}")
+
+
+def pack_chunk(chunk: ChunkData) -> bytes:
+    """Serialize a chunk to the binary chunk format"""
+    blocks = np.ascontiguousarray(chunk.data, dtype=BLOCK_DTYPE)
+    biomes = np.array(
+        [(y_max, y_min, biome) for (y_max, y_min), biome in chunk.biomes.items()], dtype=BIOME_DTYPE
+    ).reshape(-1, 3)
+    payload = blocks.tobytes() + biomes.tobytes()
+    header = CHUNK_HEADER.pack(
+        CHUNK_MAGIC, CHUNK_VERSION, *blocks.shape, len(biomes), chunk.index, zlib.crc32(payload)
+    )
+    return header + payload
+
+
+def unpack_chunk(buffer) -> Tuple[int, np.ndarray, Dict[Tuple[int, int], int]]:
+    """
+    Read a chunk from any buffer holding the binary chunk format.
+    The block array is a view into the buffer, pass a writable buffer to get an editable chunk.
+
+    :return: chunk index, block array and biome info
+    """
+    if len(buffer) < CHUNK_HEADER.size:
+        raise ChunkFormatError("truncated header")
+    magic, version, width, height, biome_count, index, crc = CHUNK_HEADER.unpack_from(buffer)
+    if magic != CHUNK_MAGIC or version != CHUNK_VERSION:
+        raise ChunkFormatError(f"unknown format {magic!r} v{version}")
+
+    blocks_size = width * height
+    payload_size = blocks_size + biome_count * 3 * BIOME_DTYPE.itemsize
+    payload = memoryview(buffer)[CHUNK_HEADER.size:CHUNK_HEADER.size + payload_size]
+    if len(payload) != payload_size:
+        raise ChunkFormatError("truncated payload")
+    if zlib.crc32(payload) != crc:
+        raise ChunkFormatError("checksum mismatch")
+
+    blocks = np.frombuffer(payload, dtype=BLOCK_DTYPE, count=blocks_size).reshape(width, height)
+    biomes = np.frombuffer(payload, dtype=BIOME_DTYPE, offset=blocks_size).reshape(-1, 3)
+    return index, blocks, {(int(y_max), int(y_min)): int(biome) for y_max, y_min, biome in biomes}
+
+
+def make_chunk(buffer, chunk_type: Type[ChunkData] = ChunkData) -> ChunkData:
+    """Create a chunk of the given type from a buffer holding the binary chunk format"""
+    index, blocks, biomes = unpack_chunk(buffer)
+    chunk = chunk_type(index * config.CHUNK_WIDTH, index, blocks)
+    chunk.biomes = biomes
+    return chunk
+
+
+class RegionFile:
+    """A file packing `size` consecutive chunks behind an offset table"""
+
+    def __init__(self, path: Path, size: int):
+        """
+        :param path: Path of the region file, created if missing
+        :param size: Number of chunk slots in the region
+        """
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()
+        self._table_end = REGION_HEADER.size + REGION_ENTRY.size * size
+
+        if not path.exists():
+            empty_table = bytes(REGION_ENTRY.size * size)
+            path.write_bytes(REGION_HEADER.pack(REGION_MAGIC, REGION_VERSION, size) + empty_table)
+        # Unbuffered so every read sees the latest write
+        self._fd = open(path, "r+b", buffering=0)
+
+        magic, version, stored_size = REGION_HEADER.unpack(self._fd.read(REGION_HEADER.size))
+        if magic != REGION_MAGIC or version != REGION_VERSION or stored_size != size:
+            raise ChunkFormatError(f"{path.name} is not a region of {size} chunks")
+        table = self._fd.read(self._table_end - REGION_HEADER.size)
+        self._table: List[Tuple[int, int]] = [
+            REGION_ENTRY.unpack_from(table, slot * REGION_ENTRY.size) for slot in range(size)
+        ]
+
+    def __contains__(self, slot: int) -> bool:
+        return self._table[slot][0] != 0
+
+    def read(self, slot: int) -> Optional[bytearray]:
+        """Read the packed chunk in a slot, None if the slot is empty"""
+        with self._lock:
+            return self._read(slot)
+
+    def _read(self, slot: int) -> Optional[bytearray]:
+        offset, length = self._table[slot]
+        if not offset:
+            return None
+        buffer = bytearray(length)
+        self._fd.seek(offset)
+        self._fd.readinto(buffer)
+        return buffer
+
+    def write(self, slot: int, data: bytes) -> None:
+        """
+        Write a packed chunk to a slot in place, reusing free space in the file where it fits.
+        The table is updated last, so an interrupted write loses the new chunk but never an old one.
+        """
+        with self._lock:
+            offset = self._find_space(len(data))
+            self._fd.seek(offset)
+            self._fd.write(data)
+            # Only point the table at the new data once it is on disk, otherwise the table entry could reach
+            # the disk first after a power loss
+            os.fsync(self._fd.fileno())
+            self._table[slot] = (offset, len(data))
+            self._fd.seek(REGION_HEADER.size + slot * REGION_ENTRY.size)
+            self._fd.write(REGION_ENTRY.pack(offset, len(data)))
+
+    def write_many(self, chunks: Dict[int, bytes]) -> None:
+        """
+        Write packed chunks to their slots atomically.
+        The whole region is written to a temporary file that then replaces the region file, so the region
+        on disk is always either the old or the new one.
+
+        :param chunks: Packed chunks by slot
+        """
+        tmp_path = self.path.with_suffix(".tmp")
+        with self._lock:
+            data = {slot: self._read(slot) for slot in range(self.size) if slot in self}
+            data.update(chunks)
+
+            table = [(0, 0)] * self.size
+            offset = self._table_end
+            for slot, packed in sorted(data.items()):
+                table[slot] = (offset, len(packed))
+                offset += len(packed)
+
+            with open(tmp_path, "wb") as file:
+                file.write(REGION_HEADER.pack(REGION_MAGIC, REGION_VERSION, self.size))
+                file.write(b"".join(REGION_ENTRY.pack(*entry) for entry in table))
+                for _, packed in sorted(data.items()):
+                    file.write(packed)
+                file.flush()
+                os.fsync(file.fileno())
+
+            self._fd.close()
+            os.replace(tmp_path, self.path)
+            self._fd = open(self.path, "r+b", buffering=0)
+            self._table = table
+
+    def close(self) -> None:
+        with self._lock:
+            self._fd.close()
+
+    def _find_space(self, length: int) -> int:
+        # First gap between the chunks that is large enough. The old data of the slot being written is still
+        # live until the table points away from it, so it is never reused by the same write.
+        extents = sorted(entry for entry in self._table if entry[0])
+        position = self._table_end
+        for offset, used in extents:
+            if offset - position >= length:
+                return position
+            position = max(position, offset + used)
+        return position
+
+
+class EditJournal:
+    """
+    Append only log of block edits, making edits durable without rewriting their chunks.
+
+    Edits are buffered in memory and written by sync(). To fold the journal into the chunks, rotate() moves
+    the logged edits to a second file, the caller writes the chunks and finish_rotation() drops the file.
+    Edits are kept in memory by chunk until then, so chunks read from storage can replay them.
+    """
+
+    def __init__(self, path: Path):
+        """
+        :param path: Path of the journal, created if missing. The rotated edits are kept next to it.
+        """
+        self.path = path
+        self.rotated_path = path.with_suffix(".old")
+        # Guards the buffer and the edits in memory, the file lock is held while the files are written
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._buffer = bytearray()
+
+        # Edits in the journal and in the rotated journal by chunk
+        self._edits: Dict[int, List[BlockEdit]] = {}
+        self._rotated: Dict[int, List[BlockEdit]] = {}
+        if self.rotated_path.exists():
+            self._rotated = self._read(self.rotated_path)
+        if path.exists():
+            self._edits = self._read(path)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION))
+        self._file = open(path, "ab")
+
+    @staticmethod
+    def _read(path: Path) -> Dict[int, List[BlockEdit]]:
+        data = path.read_bytes()
+        if len(data) < JOURNAL_HEADER.size or JOURNAL_HEADER.unpack_from(data) != (JOURNAL_MAGIC, JOURNAL_VERSION):
+            raise ChunkFormatError(f"{path.name} is not an edit journal")
+        # A crash while appending can leave a partial record at the end
+        end = len(data) - (len(data) - JOURNAL_HEADER.size) % JOURNAL_RECORD.size
+        edits: Dict[int, List[BlockEdit]] = {}
+        for record in JOURNAL_RECORD.iter_unpack(memoryview(data)[JOURNAL_HEADER.size:end]):
+            edit = BlockEdit(*record)
+            edits.setdefault(edit.chunk, []).append(edit)
+        return edits
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(map(len, self._edits.values())) + sum(map(len, self._rotated.values()))
+
+    def append(self, edit: BlockEdit) -> None:
+        """Log an edit, it is durable after the next sync"""
+        with self._lock:
+            self._buffer += JOURNAL_RECORD.pack(*edit)
+            self._edits.setdefault(edit.chunk, []).append(edit)
+
+    def edits(self, index: int) -> List[BlockEdit]:
+        """Edits of a chunk that are not folded into the chunk's storage yet, oldest first"""
+        with self._lock:
+            return self._rotated.get(index, []) + self._edits.get(index, [])
+
+    def sync(self) -> None:
+        """Write the buffered edits to the journal and flush them to disk"""
+        with self._file_lock:
+            # Only swapping the buffer holds the lock append waits for, never the write
+            with self._lock:
+                buffer, self._buffer = self._buffer, bytearray()
+            if not buffer:
+                return
+            self._file.write(buffer)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def rotate(self) -> Dict[int, List[BlockEdit]]:
+        """
+        Move the logged edits to the rotated journal and start an empty journal.
+
+        :return: All rotated edits by chunk, including ones left over from an interrupted rotation
+        """
+        with self._file_lock:
+            with self._lock:
+                buffer, self._buffer = self._buffer, bytearray()
+                moved = bool(self._edits)
+                for index, edits in self._edits.items():
+                    self._rotated.setdefault(index, []).extend(edits)
+                self._edits = {}
+                rotated = {index: list(edits) for index, edits in self._rotated.items()}
+
+            if moved:
+                # Append to edits left by an earlier rotation that never finished
+                data = self.path.read_bytes()[JOURNAL_HEADER.size:] + buffer
+                with open(self.rotated_path, "ab") as file:
+                    if file.tell() == 0:
+                        file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION))
+                    file.write(data)
+                    file.flush()
+                    os.fsync(file.fileno())
+                self._file.truncate(JOURNAL_HEADER.size)
+        return rotated
+
+    def finish_rotation(self) -> None:
+        """Drop the rotated edits once the chunks they belong to are written"""
+        with self._file_lock:
+            with self._lock:
+                self._rotated = {}
+            self.rotated_path.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        self.sync()
+        with self._file_lock:
+            self._file.close()
+
+
+class ChunkStore:
+    """Chunk storage for a world, grouping chunks into region files"""
+
+    def __init__(self, directory: Path, region_size: int = config.REGION_SIZE,
+                 chunk_type: Type[ChunkData] = ChunkData):
+        """
+        :param directory: Directory holding the region files
+        :param region_size: Number of consecutive chunks per region file
+        :param chunk_type: Type of the loaded chunks, like misc.chunk.HorizontalChunk for chunks the game draws
+        """
+        self.directory = directory
+        self.region_size = region_size
+        self.chunk_type = chunk_type
+        self._regions: Dict[int, RegionFile] = {}
+        self._lock = threading.Lock()
+        # Held while chunks are written, so a chunk is never read between being written and its edits dropped
+        self._write_lock = threading.Lock()
+        self.journal = EditJournal(directory / "journal.bin")
+
+    def _region(self, index: int, create: bool = False) -> Optional[RegionFile]:
+        region_id = index // self.region_size
+        with self._lock:
+            region = self._regions.get(region_id)
+            if region is None:
+                path = self.directory / f"region_{region_id}.bin"
+                if not create and not path.exists():
+                    return None
+                self.directory.mkdir(parents=True, exist_ok=True)
+                region = self._regions[region_id] = RegionFile(path, self.region_size)
+        return region
+
+    def load_seed(self) -> Optional[int]:
+        """The seed the world was generated with, None for a new world"""
+        path = self.directory / "seed"
+        return int(path.read_text()) if path.exists() else None
+
+    def save_seed(self, seed: int) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / "seed").write_text(str(seed))
+
+    def has_chunk(self, index: int) -> bool:
+        region = self._region(index)
+        return region is not None and index % self.region_size in region
+
+    def save_chunk(self, chunk: ChunkData) -> None:
+        """Write a chunk to its region"""
+        self._region(chunk.index, create=True).write(chunk.index % self.region_size, pack_chunk(chunk))
+
+    def save_chunks(self, chunks: Iterable[ChunkData]) -> None:
+        """Write chunks atomically, rewriting each affected region once"""
+        regions: Dict[int, List[ChunkData]] = {}
+        for chunk in chunks:
+            regions.setdefault(chunk.index // self.region_size, []).append(chunk)
+
+        for region_chunks in regions.values():
+            packed = {chunk.index % self.region_size: pack_chunk(chunk) for chunk in region_chunks}
+            self._region(region_chunks[0].index, create=True).write_many(packed)
+
+    def save_new_chunks(self, chunks: Iterable[ChunkData]) -> List[ChunkData]:
+        """Write the chunks that are not saved yet like save_chunks, returning the written chunks"""
+        with self._write_lock:
+            chunks = [chunk for chunk in chunks if not self.has_chunk(chunk.index)]
+            self.save_chunks(chunks)
+        return chunks
+
+    def compact(self) -> None:
+        """Fold the edits in the journal into the chunks they belong to"""
+        with self._write_lock:
+            edits = self.journal.rotate()
+            chunks = []
+            for index, chunk_edits in edits.items():
+                chunk = self.load_chunk(index)
+                if chunk is not None:
+                    chunk.replay(chunk_edits)
+                    chunks.append(chunk)
+            self.save_chunks(chunks)
+            self.journal.finish_rotation()
+
+    def load_chunk(self, index: int) -> Optional[ChunkData]:
+        """Read a chunk from its region in a single read, None if it was never saved"""
+        region = self._region(index)
+        buffer = region and region.read(index % self.region_size)
+        if buffer is None:
+            return None
+        return make_chunk(buffer, self.chunk_type)
+
+    def load_edited_chunk(self, index: int) -> Optional[ChunkData]:
+        """Read a chunk like load_chunk and replay its edits from the journal"""
+        with self._write_lock:
+            chunk = self.load_chunk(index)
+            if chunk is not None:
+                chunk.replay(self.journal.edits(index))
+        return chunk
+
+    def close(self) -> None:
+        self.compact()
+        self.journal.close()
+        with self._lock:
+            for region in self._regions.values():
+                region.close()
+            self._regions.clear()
+
+
+class ChunkWriter:
+    """Background thread syncing the edit journal of a store and folding it into the chunks on a timer"""
+
+    def __init__(self, store: ChunkStore, interval: float = config.AUTOSAVE_INTERVAL,
+                 sync_interval: float = config.JOURNAL_SYNC_INTERVAL):
+        """
+        :param store: Store to write
+        :param interval: Seconds between compacting the journal
+        :param sync_interval: Seconds between syncing the journal to disk
+        """
+        self.store = store
+        self.interval = interval
+        self.sync_interval = sync_interval
+        self._stopped = threading.Event()
+        # Run as daemon thread, stop() writes everything left on shutdown
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """Start the thread if not already started"""
+        if not self.thread.is_alive() and not self._stopped.is_set():
+            self.thread.start()
+
+    def _run(self):
+        last_write = time.monotonic()
+        while not self._stopped.wait(self.sync_interval):
+            self.store.journal.sync()
+            if time.monotonic() - last_write >= self.interval:
+                self.store.compact()
+                last_write = time.monotonic()
+
+    def stop(self):
+        """Stop the thread and write everything that is still waiting"""
+        self._stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.store.compact()
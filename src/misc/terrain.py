@@ -1,9 +1,13 @@
 from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from copy import deepcopy
 from functools import cache
+from itertools import islice
 from math import ceil, floor
-from random import choice, choices, randint
-from typing import Callable, Deque, Dict, NewType, Tuple
+import multiprocessing
+import os
+from random import getrandbits
+from typing import Callable, Container, Deque, Dict, Iterable, Iterator, List, NewType, Optional, Tuple
 
 import numpy as np
 import numpy.typing as npt
@@ -86,79 +90,69 @@ def __tree(tree_type: Hex, jungle: bool = False) -> np.ndarray:
     return t
 
 
-def __volcano(volcano_w: int) -> np.ndarray:
+def __volcano(rng: np.random.Generator, volcano_w: int) -> np.ndarray:
     # Function to generate a numpy volcano
     n_factor = volcano_w / 2
     volcano_h = ceil(n_factor)
     volcano = np.zeros((volcano_h, volcano_w))
     for i in range(volcano_h):
         volcano[floor(n_factor) - i, 0 + i:volcano_w - i] = 1
-    volcano[volcano == 1] = np.random.choice([142, 143, 144, 145], p=[0.1, 0.5, 0.1, 0.3], size=volcano_h ** 2)
+    volcano[volcano == 1] = rng.choice([142, 143, 144, 145], p=[0.1, 0.5, 0.1, 0.3], size=volcano_h ** 2)
     volcano[volcano == 0] = 128
     return volcano
 
 
-def __gen_empty_chunks(x_min: int, x_max: int, y_min: int, y_max: int) \
-        -> Dict[Tuple[int, ...], TArray]:
-    # For generating empty chunks.
-    world = {}
-    for x in range(x_min, x_max, 16):
-        for y in range(y_min, y_max, 16):
-            world[(x + 16, x, y + 16, y)] = TArray(np.empty((16, 16), dtype=int))
-    return world
-
-
-def __sky_gen(y_max: int = None) -> TArray:
+def __sky_gen(rng: np.random.Generator, y_max: int = None) -> TArray:
     # For generating the sky.
     y_max = config.HEIGHT_MIN + 320
     sky = TArray(np.full((16, 16), 128))
-    clouds_co_ords = np.random.randint(16, size=(14, 2))
-    sky = __placer(4, 129, clouds_co_ords, sky)
+    clouds_co_ords = rng.integers(16, size=(14, 2))
+    sky = __placer(rng, 4, 129, clouds_co_ords, sky)
     sky.adv_info[(y_max, y_max - 80)] = 1
     return sky
 
 
-def __generate_upper_mine() -> TArray:
+def __generate_upper_mine(rng: np.random.Generator) -> TArray:
     # For generating the upper part of the mine.
     y_max = config.HEIGHT_MIN + 320
     mine = TArray(np.full((16, 16), 130), 2)
 
-    dirt_co_ords = np.random.randint(16, size=(10, 2))
-    mine = __placer(randint(6, 8), 131, dirt_co_ords, mine)
+    dirt_co_ords = rng.integers(16, size=(10, 2))
+    mine = __placer(rng, int(rng.integers(6, 9)), 131, dirt_co_ords, mine)
     mine.adv_info[(y_max - 160, y_max - 192)] = 2
     return mine
 
 
-def __generate_middle_mine(y: int, biome_code: int = None) -> TArray:
+def __generate_middle_mine(rng: np.random.Generator, y: int, biome_code: int = None) -> TArray:
     # For generating the main part of the mine
     y_max = config.HEIGHT_MIN + 320
     mine = TArray(np.full((16, 16), 130))
-    coal_co_ords = np.random.randint(16, size=(7, 2))
-    iron_co_ords = np.random.randint(16, size=(4, 2))
-    diamond_co_ords = np.random.randint(16, size=(2, 2))
+    coal_co_ords = rng.integers(16, size=(7, 2))
+    iron_co_ords = rng.integers(16, size=(4, 2))
+    diamond_co_ords = rng.integers(16, size=(2, 2))
 
     if y_max - 272 > y >= y_max - 288 or biome_code == 5:
-        mine = __placer(choices((6, 7, 8, 9, 10, 11, 12), (0.3, 0.3, 0.1, 0.1, 0.08, 0.09, 0.03), k=1)[0],
+        mine = __placer(rng, rng.choice((6, 7, 8, 9, 10, 11, 12), p=(0.3, 0.3, 0.1, 0.1, 0.08, 0.09, 0.03)),
                         132, coal_co_ords, mine)
-        mine = __placer(choices((4, 5, 6, 7, 8, 9, 10), (0.3, 0.3, 0.1, 0.1, 0.08, 0.09, 0.03), k=1)[0],
+        mine = __placer(rng, rng.choice((4, 5, 6, 7, 8, 9, 10), p=(0.3, 0.3, 0.1, 0.1, 0.08, 0.09, 0.03)),
                         133, iron_co_ords, mine)
-        mine = __placer(choices((2, 3, 4, 5, 6, 7, 8), (0.3, 0.3, 0.1, 0.1, 0.08, 0.09, 0.03), k=1)[0],
+        mine = __placer(rng, rng.choice((2, 3, 4, 5, 6, 7, 8), p=(0.3, 0.3, 0.1, 0.1, 0.08, 0.09, 0.03)),
                         134, diamond_co_ords, mine)
 
         mine.adv_info[(y_max - 272, y_max - 288)] = 5
 
     elif y_max - 192 >= y > y_max - 224 or biome_code == 3:
-        mine = __placer(choices((10, 11, 12, 13, 14, 15, 16), (0.3, 0.3, 0.1, 0.1, 0.08, 0.09, 0.03), k=1)[0],
+        mine = __placer(rng, rng.choice((10, 11, 12, 13, 14, 15, 16), p=(0.3, 0.3, 0.1, 0.1, 0.08, 0.09, 0.03)),
                         132, coal_co_ords, mine)
-        mine = __placer(choices((7, 8, 9, 10, 11, 12, 13), (0.3, 0.3, 0.1, 0.1, 0.08, 0.09, 0.03), k=1)[0],
+        mine = __placer(rng, rng.choice((7, 8, 9, 10, 11, 12, 13), p=(0.3, 0.3, 0.1, 0.1, 0.08, 0.09, 0.03)),
                         133, iron_co_ords, mine)
 
         mine.adv_info[(y_max - 192, y_max - 224)] = 3
 
     elif y_max - 224 >= y >= y_max - 272 or biome_code == 4:
-        mine = __placer(choices((7, 8, 9, 10, 11, 12, 13), (0.3, 0.3, 0.1, 0.1, 0.08, 0.09, 0.03), k=1)[0],
+        mine = __placer(rng, rng.choice((7, 8, 9, 10, 11, 12, 13), p=(0.3, 0.3, 0.1, 0.1, 0.08, 0.09, 0.03)),
                         132, coal_co_ords, mine)
-        mine = __placer(choices((10, 11, 12, 13, 14, 15, 16), (0.3, 0.3, 0.1, 0.1, 0.08, 0.09, 0.03), k=1)[0],
+        mine = __placer(rng, rng.choice((10, 11, 12, 13, 14, 15, 16), p=(0.3, 0.3, 0.1, 0.1, 0.08, 0.09, 0.03)),
                         133, iron_co_ords, mine)
         mine.adv_info[(y_max - 224, y_max - 272)] = 4
 
@@ -171,10 +165,10 @@ def __generate_lower_mine(y_min: int) -> TArray:
     return mine
 
 
-def __gen_forest(y: int, biome_code: int = None) -> TArray:
+def __gen_forest(rng: np.random.Generator, y: int, biome_code: int = None) -> TArray:
     # For generating forest biome.
     y_max = config.HEIGHT_MIN + 320
-    tree_type = choice(('0x88', '0x8a', '0x8c'))
+    tree_type = str(rng.choice(('0x88', '0x8a', '0x8c')))
     if y_max - 128 > y >= y_max - 160 or biome_code == 8:
         biome = TArray(np.full((16, 16), 131))
         biome.adv_info[(y_max - 128, y_max - 160)] = 8
@@ -183,7 +177,7 @@ def __gen_forest(y: int, biome_code: int = None) -> TArray:
         biome.adv_info[(y_max - 80, y_max - 128)] = 7
 
     if y_max - 128 >= y > y_max - 144 or biome_code == 9:
-        no_of_trees = randint(2, 3)
+        no_of_trees = int(rng.integers(2, 4))
         for i in range(no_of_trees):
             biome[10:16, i + 2 + i * 3: i + 5 + i * 3] = __tree(tree_type)
         biome.adv_info[(y_max - 128, y_max - 144)] = 9
@@ -191,10 +185,10 @@ def __gen_forest(y: int, biome_code: int = None) -> TArray:
     return biome
 
 
-def __gen_plain(y: int, biome_code: int = None) -> TArray:
+def __gen_plain(rng: np.random.Generator, y: int, biome_code: int = None) -> TArray:
     # For generating plains biome.
     y_max = config.HEIGHT_MIN + 320
-    if y_max - 128 > y >= y_max - 160 or biome_code == 1:
+    if y_max - 128 > y >= y_max - 160 or biome_code == 11:
         biome = TArray(np.full((16, 16), 131))
         biome.adv_info[(y_max - 128, y_max - 160)] = 11
         if y == y_max - 144 or biome_code == 12:
@@ -207,19 +201,19 @@ def __gen_plain(y: int, biome_code: int = None) -> TArray:
     return biome
 
 
-def __gen_desert(y: int, biome_code: int = None) -> TArray:
+def __gen_desert(rng: np.random.Generator, y: int, biome_code: int = None) -> TArray:
     # For generating desert biome.
     y_max = config.HEIGHT_MIN + 320
     if y_max - 128 > y >= y_max - 160 or biome_code == 14:
         biome = TArray(np.full((16, 16), 152))
         biome.adv_info[(y_max - 128, y_max - 160)] = 14
     else:
-        biome = np.full((16, 16), 128)
+        biome = TArray(np.full((16, 16), 128))
         biome.adv_info[(y_max - 80, y_max - 128)] = 13
 
     if y_max - 128 >= y > y_max - 144 or biome_code == 15:
-        no_of_cactus = randint(1, 5)
-        no_of_dead_bush = randint(2, 3)
+        no_of_cactus = int(rng.integers(1, 6))
+        no_of_dead_bush = int(rng.integers(2, 4))
         for i in range(no_of_dead_bush):
             biome[15:16, 1 + i * 4:2 + i * 4] = 154
         for i in range(no_of_cactus):
@@ -229,7 +223,7 @@ def __gen_desert(y: int, biome_code: int = None) -> TArray:
     return biome
 
 
-def __gen_volcanoes(y: int, biome_code: int = None) -> TArray:
+def __gen_volcanoes(rng: np.random.Generator, y: int, biome_code: int = None) -> TArray:
     # For generating volcanic biome.
     y_max = config.HEIGHT_MIN + 320
     if y_max - 128 > y >= y_max - 160 or biome_code == 17:
@@ -240,17 +234,17 @@ def __gen_volcanoes(y: int, biome_code: int = None) -> TArray:
         biome.adv_info[(y_max - 80, y_max - 128)] = 16
 
     if y_max - 128 >= y > y_max - 144 or biome_code == 18:
-        volcano_w = choice((9, 11, 13))
-        biome[16 - floor(volcano_w / 2) - 1:16, 2:2 + volcano_w] = __volcano(volcano_w)
+        volcano_w = int(rng.choice((9, 11, 13)))
+        biome[16 - floor(volcano_w / 2) - 1:16, 2:2 + volcano_w] = __volcano(rng, volcano_w)
         biome.adv_info[(y_max - 128, y_max - 144)] = 18
 
     return biome
 
 
-def __gen_jungles(y: int, biome_code: int = None) -> TArray:
+def __gen_jungles(rng: np.random.Generator, y: int, biome_code: int = None) -> TArray:
     # For generating jungle biome.
     y_max = config.HEIGHT_MIN + 320
-    jungle_tree_type = choice(('0x96', '0x94'))
+    jungle_tree_type = str(rng.choice(('0x96', '0x94')))
 
     if y_max - 128 > y >= y_max - 160 or biome_code == 20:
         biome = TArray(np.full((16, 16), 147))
@@ -261,120 +255,242 @@ def __gen_jungles(y: int, biome_code: int = None) -> TArray:
         biome.adv_info[(y_max - 80, y_max - 128)] = 19
 
     if y_max - 128 >= y > y_max - 144 or biome_code == 21:
-        no_of_trees = randint(1, 2)
+        no_of_trees = int(rng.integers(1, 3))
         for i in range(no_of_trees):
             biome[6:16, i + i * 5: i + 5 + i * 5] = __tree(jungle_tree_type, True)
         biome.adv_info[(y_max - 128, y_max - 144)] = 21
     return biome
 
 
-def __placer(range_: int, block_id: int, co_ords_arr: TArray,
+def __placer(rng: np.random.Generator, range_: int, block_id: int, co_ords_arr: np.ndarray,
              main: TArray
              ) -> TArray:
     # For adding chain of blocks to a chunk.
-    main_arr = main.arr
-    for co_ord_arr in co_ords_arr:
-        x_inc = 0
-        y_inc = 0
-        for _ in range(range_):
-            to_be_inc = randint(0, 1)
-            if to_be_inc == 1:
-                x_inc += 1
-            else:
-                y_inc += 1
-
-            if co_ord_arr[0] + x_inc < 16 and co_ord_arr[1] + y_inc < 16:
-                main_arr[co_ord_arr[1] + y_inc, co_ord_arr[0] + x_inc] = block_id
-
-            elif co_ord_arr[0] + x_inc < 16 and co_ord_arr[1] + y_inc > 15:
-                main_arr[co_ord_arr[1], co_ord_arr[0] + x_inc] = block_id
-
-            elif co_ord_arr[0] + x_inc > 15 and co_ord_arr[1] + y_inc < 16:
-                main_arr[co_ord_arr[1] + y_inc, co_ord_arr[0]] = block_id
-    main.arr = main_arr
+    # Every vein walks range_ steps from its (x, y) start, each step going right (1) or down (0).
+    steps = rng.integers(2, size=(len(co_ords_arr), range_))
+    x = co_ords_arr[:, :1] + np.cumsum(steps, axis=1)
+    y = co_ords_arr[:, 1:] + np.cumsum(1 - steps, axis=1)
+    x_inside = x < 16
+    y_inside = y < 16
+    # A step leaving the chunk on one axis stays at the vein's start on that axis,
+    # steps outside on both axes are dropped.
+    placed = x_inside | y_inside
+    rows = np.where(y_inside, y, co_ords_arr[:, 1:])[placed]
+    columns = np.where(x_inside, x, co_ords_arr[:, :1])[placed]
+    main.arr[rows, columns] = block_id
     return main
 
 
-def gen_world(x_min: int = -192, x_max: int = 192, y_min: int = -160, y_max: int = 160
+BIOMES: List[Callable[..., TArray]] = [__gen_forest, __gen_plain, __gen_desert, __gen_volcanoes, __gen_jungles]
+
+
+def new_seed() -> int:
+    """A random world seed"""
+    return getrandbits(63)
+
+
+def chunk_rng(seed: int, x: int, y: int) -> np.random.Generator:
+    """The random generator for the 16 x 16 chunk at (x, y), independent of any other chunk.
+    :param seed: The world seed.
+    :param x: The x-axis point of the chunk.
+    :param y: The y-axis point of the chunk.
+    """
+    # SeedSequence only takes non-negative entropy, wrap negative seeds and co-ordinates around.
+    return np.random.default_rng([seed & 0xFFFFFFFFFFFFFFFF, x & 0xFFFFFFFF, y & 0xFFFFFFFF])
+
+
+@cache
+def biome_layout(seed: int, x_min: int, x_max: int) -> List[int]:
+    """The index into BIOMES of each 16 block wide column from x_min to x_max.
+    :param seed: The world seed.
+    :param x_min: The x-axis point from where the layout starts.
+    :param x_max: The x-axis point till where the layout goes.
+    """
+    rng = np.random.default_rng([seed & 0xFFFFFFFFFFFFFFFF, x_min & 0xFFFFFFFF, x_max & 0xFFFFFFFF, 1])
+    free_chunks_horizontal = (x_max - x_min) // 16
+    no_of_biomes = int(rng.integers(2, 5))
+    biomes_nf = []
+    biomes_area = []
+    for _ in range(no_of_biomes):
+        biome = int(rng.integers(len(BIOMES)))
+        if biome not in biomes_nf:
+            biomes_nf.append(biome)
+            biomes_area.append(free_chunks_horizontal // no_of_biomes)
+        else:
+            biomes_area[biomes_nf.index(biome)] += free_chunks_horizontal // no_of_biomes
+
+    layout = [biome for biome, area in zip(biomes_nf, biomes_area) for _ in range(area)]
+    # The last biome takes whatever doesn't divide evenly
+    return layout + [biomes_nf[-1]] * (free_chunks_horizontal - len(layout))
+
+
+def column_biome(seed: int, x: int, x_min: int, x_max: int) -> int:
+    """The index into BIOMES of the column at x, anywhere in an unbounded world.
+    The world is split into spans as wide as x_min..x_max, each with its own biome_layout.
+    :param seed: The world seed.
+    :param x: The x-axis point of the column.
+    :param x_min: The x-axis point from where the first span starts.
+    :param x_max: The x-axis point till where the first span goes.
+    """
+    width = x_max - x_min
+    span_min = x_min + (x - x_min) // width * width
+    return biome_layout(seed, span_min, span_min + width)[(x - span_min) // 16]
+
+
+def __gen_tile(rng: np.random.Generator, y: int, y_min: int, y_max: int, biome: int) -> TArray:
+    # For generating the chunk at height y of a column.
+    # generating sky
+    if y >= y_max - 80:
+        return __sky_gen(rng)
+
+    # generating upper mine
+    elif y_max - 160 > y >= y_max - 192:
+        return __generate_upper_mine(rng)
+
+    # generating middle mine
+    elif y_max - 192 > y >= y_max - 288:
+        return __generate_middle_mine(rng, y)
+
+    # generating lower mine
+    elif y <= y_min + 16:
+        return __generate_lower_mine(y_min)
+
+    # generating biomes
+    return BIOMES[biome](rng, y)
+
+
+def gen_column(seed: int, x: int, biome: int, y_min: int, y_max: int) -> Dict[Tuple[int, ...], TArray]:
+    """Generate the chunks of one 16 block wide column, bottom to top.
+    :param seed: The world seed.
+    :param x: The x-axis point of the column.
+    :param biome: Index into BIOMES of the column's biome, see biome_layout.
+    :param y_min: The y-axis point from where it has to generate the column.
+    :param y_max: The y-axis point till where it will generate the column.
+    """
+    column = {}
+    for y in range(y_min, y_max, 16):
+        column[(x + 16, x, y + 16, y)] = __gen_tile(chunk_rng(seed, x, y), y, y_min, y_max, biome)
+    return column
+
+
+def __gen_columns(seed: int, columns: List[Tuple[int, int]], y_min: int, y_max: int
+                  ) -> List[Tuple[int, Dict[Tuple[int, ...], TArray]]]:
+    # Worker task for gen_world_parallel, generates a batch of (x, biome) columns.
+    return [(x, gen_column(seed, x, biome, y_min, y_max)) for x, biome in columns]
+
+
+def __outwards(first: int, count: int) -> Iterator[int]:
+    # The indices 0 to count - 1 by distance to first, left before right.
+    yield first
+    for distance in range(1, count):
+        if first - distance >= 0:
+            yield first - distance
+        if first + distance < count:
+            yield first + distance
+
+
+def __world_columns(seed: int, x_min: int, x_max: int, center: Optional[int] = None, skip: Container[int] = (),
+                    span: Optional[Tuple[int, int]] = None) -> Iterator[Tuple[int, int]]:
+    # The (x, biome) columns of a world in biome order, or outwards from the column at center.
+    span = span or (x_min, x_max)
+    count = len(range(x_min, x_max, 16))
+    order: Iterable[int] = range(count)
+    if center is not None:
+        order = __outwards(min(max((center - x_min) // 16, 0), count - 1), count)
+    for i in order:
+        x = x_min + i * 16
+        if x not in skip:
+            yield x, column_biome(seed, x, *span)
+
+
+def iter_world(x_min: int, x_max: int, y_min: int, y_max: int, seed: int, center: Optional[int] = None,
+               skip: Container[int] = ()) -> Iterator[Tuple[int, Dict[Tuple[int, ...], TArray]]]:
+    """Generate the same world as gen_world, yielding (x, chunks) one finished column at a time in biome order.
+    Only the column being generated is in memory, drop the columns once they are saved.
+    :param x_min: The x-axis point from where it has to generate the world.
+    :param x_max: The x-axis point till where it will generate the world.
+    :param y_min: The y-axis point from where it has to generate the world.
+    :param y_max: The y-axis point till where it will generate the world.
+    :param seed: The world seed.
+    :param center: Yield the columns closest to this x-axis point first instead of from left to right.
+    :param skip: x-axis points of columns not to generate, like the ones that are saved already.
+    """
+    for x, biome in __world_columns(seed, x_min, x_max, center, skip):
+        yield x, gen_column(seed, x, biome, y_min, y_max)
+
+
+def gen_world(x_min: int = -192, x_max: int = 192, y_min: int = -160, y_max: int = 160, seed: int = None
               ) -> Dict[Tuple[int, ...], TArray]:
     """When called without any arguments it generates the initial world.
     Call with Arguments to generate or load more world. Also please keep the difference of y_min and y_max 320.
+    Every chunk only depends on the seed and its own position, so any part of the world can be regenerated.
+    Keeps the whole world in memory, use iter_world or gen_world_parallel to save it column by column.
     :param x_min: The x-axis point from where it has to generate the world.
     :param x_max: The x-axis point till where it will generate the world.
     :param y_min: The y-axis point from where it has to generate the world.
     :param y_max: The y-axis point till where it will generate the world.
+    :param seed: The world seed, a random one is used if not given.
     """
-    world = __gen_empty_chunks(x_min, x_max, y_min, y_max)
-    free_chunks_horizontal = int((abs(x_min) + abs(x_max)) / 16)
-    no_of_biomes = randint(2, 4)
-    biomes_choices = [__gen_forest, __gen_plain, __gen_desert, __gen_volcanoes, __gen_jungles]
-    biomes_nf = deque()
-    biomes_area = deque()
-    for _ in range(no_of_biomes):
-        biome = choice(biomes_choices)
-        if biome not in biomes_nf:
-            biomes_nf.append(biome)
-            biomes_area.append(int(free_chunks_horizontal / no_of_biomes) * 5)
-        else:
-            i = biomes_nf.index(biome)
-            biomes_area[i] += int(free_chunks_horizontal / no_of_biomes) * 5
-
-    biomes = dict(enumerate([deque(elem) for elem in zip(biomes_area, biomes_nf)]))
-    biomes: Dict[int, Deque[int, Callable[[int, int], TArray]]]
-    i = 0
-    for co_ords, _ in world.items():
-        # generating sky
-        if co_ords[3] >= y_max - 80:
-            world[co_ords] = __sky_gen()
-
-        # generating upper mine
-        elif y_max - 160 > co_ords[3] >= y_max - 192:
-            world[co_ords] = __generate_upper_mine()
-
-        # generating middle mine
-        elif y_max - 192 > co_ords[3] >= y_max - 288:
-            world[co_ords] = __generate_middle_mine(co_ords[3])
-
-        # generating lower mine
-        elif co_ords[3] <= y_min + 16:
-            world[co_ords] = __generate_lower_mine(y_min)
-
-        # generating biomes
-        else:
-            if biomes[i][0] != 0:
-                pass
-            else:
-                if len(biomes) - 1 > i:
-                    i += 1
-
-            function: Callable[[int, int], TArray] = biomes[i][1]
-
-            if biomes[i][1] == __gen_forest:
-                world[co_ords] = function(co_ords[3])
-            elif biomes[i][1] == __gen_jungles:
-                world[co_ords] = function(co_ords[3])
-            else:
-                world[co_ords] = function(co_ords[3])
-            biomes[i][0] -= 1
+    if seed is None:
+        seed = new_seed()
+    world = {}
+    for _, column in iter_world(x_min, x_max, y_min, y_max, seed):
+        world.update(column)
 
     return world
 
 
-def gen_chunk(y: int, biome_code: int):
-    biomes = [__gen_forest, __gen_plain, __gen_desert, __gen_volcanoes, __gen_jungles]
-    if biome_code / 3 - 2 > 0:
-        return biomes[biome_code // 3 - 2](y, biome_code=biome_code)
-    else:
-        biomes = [__sky_gen, __generate_upper_mine, __generate_lower_mine]
-        if biome_code in (3, 4, 5):
-            return __generate_middle_mine(y, biome_code=biome_code)
-        elif biome_code == 6:
-            return biomes[2](config.HEIGHT_MIN)
-        else:
-            return biomes[biome_code - 1](config.HEIGHT_MIN + 320)
-
-
-if __name__ == '__main__':
-    world = gen_world(-496, 496)
-    with open("world.npy", "wb") as f:
-        np.save(f, world, allow_pickle=True)
+def gen_world_parallel(x_min: int, x_max: int, y_min: int, y_max: int, seed: int, workers: Optional[int] = None,
+                       center: Optional[int] = None, skip: Container[int] = (), batch_size: int = 4,
+                       span: Optional[Tuple[int, int]] = None) -> Iterator[Tuple[int, Dict[Tuple[int, ...], TArray]]]:
+    """Generate the same world as iter_world on a process pool, yielding (x, chunks) one column at a time
+    in biome order as soon as the column's batch is done.
+    At most two batches per worker are generated ahead of the caller, so memory does not grow with the width
+    of the world. Closing the iterator early cancels the batches that have not started.
+    :param x_min: The x-axis point from where it has to generate the world.
+    :param x_max: The x-axis point till where it will generate the world.
+    :param y_min: The y-axis point from where it has to generate the world.
+    :param y_max: The y-axis point till where it will generate the world.
+    :param seed: The world seed.
+    :param workers: Number of worker processes, defaults to the number of CPUs.
+    :param center: Yield the columns closest to this x-axis point first instead of from left to right.
+    :param skip: x-axis points of columns not to generate, like the ones that are saved already.
+    :param batch_size: Columns per worker task, a few columns per task keep the task overhead low.
+    :param span: x_min and x_max of the world the biomes are laid out for, see column_biome. Defaults to x_min
+                 and x_max, pass the world's span to generate part of a world or columns outside of it.
+    """
+    workers = workers or os.cpu_count() or 1
+    columns = __world_columns(seed, x_min, x_max, center, skip, span)
+    pending: Deque[Future] = deque()
+
+    # Not forked, callers run this on a background thread and a forked child could inherit a held lock
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        while True:
+            batch = list(islice(columns, batch_size))
+            if not batch:
+                break
+            pending.append(executor.submit(__gen_columns, seed, batch, y_min, y_max))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def gen_chunk(y: int, biome_code: int, rng: np.random.Generator) -> TArray:
+    """Generate a single chunk from the biome code it was generated with.
+    :param y: The y-axis point of the chunk.
+    :param biome_code: One of the BIOME CODES.
+    :param rng: The chunk's random generator, see chunk_rng.
+    """
+    if biome_code > 6:
+        return BIOMES[(biome_code - 7) // 3](rng, y, biome_code=biome_code)
+    elif biome_code in (3, 4, 5):
+        return __generate_middle_mine(rng, y, biome_code=biome_code)
+    elif biome_code == 6:
+        return __generate_lower_mine(config.HEIGHT_MIN)
+    elif biome_code == 2:
+        return __generate_upper_mine(rng)
+    return __sky_gen(rng, config.HEIGHT_MIN + 320)
@@ -0,0 +1,95 @@
+import threading
+from typing import List, Optional
+
+from misc.chunk_data import ChunkData
+from misc.storage import ChunkStore
+from misc.terrain import gen_world_parallel
+from utils import Timer
+import config
+
+
+class WorldGenerator:
+    """
+    Generates the chunks of a range of the world that are not saved yet on a background thread,
+    saving them as they come.
+
+    Columns closest to the spawn are generated first so the game can start before the whole world is saved.
+    Chunks the chunk loader generated and saved in the meantime are left as they are.
+    """
+
+    def __init__(self, store: ChunkStore, seed: int, center_chunk: int = 0, batch_size: int = config.REGION_SIZE,
+                 workers: Optional[int] = config.WORLD_GEN_WORKERS, min_chunk: int = config.WORLD_MIN_CHUNK,
+                 max_chunk: int = config.WORLD_MAX_CHUNK):
+        """
+        :param store: Storage the chunks are saved to
+        :param seed: World seed
+        :param center_chunk: Index of the chunk generated first, like the player's chunk
+        :param batch_size: Chunks saved at once
+        :param workers: Processes generating chunks, one per CPU if None
+        :param min_chunk: Index of the first chunk to generate
+        :param max_chunk: Index after the last chunk to generate
+        """
+        self.store = store
+        self.seed = seed
+        self.center_chunk = center_chunk
+        self.batch_size = batch_size
+        self.workers = workers
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+
+        self._saved_chunks = {index for index in range(min_chunk, max_chunk) if store.has_chunk(index)}
+        self.total = max_chunk - min_chunk
+        # Chunks of the range that are saved, including the ones saved before
+        self.saved = len(self._saved_chunks)
+        self._stopped = threading.Event()
+        # Run as daemon thread, stop() waits for the chunks being generated and saves them
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def progress(self) -> float:
+        """Part of the world that is saved, from 0 to 1"""
+        return self.saved / self.total if self.total else 1.0
+
+    @property
+    def done(self) -> bool:
+        return self.saved >= self.total
+
+    def start(self):
+        """Start the thread if not already started"""
+        if not self.thread.is_alive() and not self._stopped.is_set():
+            self.thread.start()
+
+    def _run(self):
+        timer = Timer("world_gen")
+        columns = gen_world_parallel(
+            self.min_chunk * config.CHUNK_WIDTH, self.max_chunk * config.CHUNK_WIDTH,
+            config.HEIGHT_MIN, config.HEIGHT_MIN + config.CHUNK_HEIGHT, seed=self.seed, workers=self.workers,
+            center=self.center_chunk * config.CHUNK_WIDTH,
+            skip={index * config.CHUNK_WIDTH for index in self._saved_chunks},
+            # Same biomes as the chunk loader generates
+            span=(config.WORLD_MIN_CHUNK * config.CHUNK_WIDTH, config.WORLD_MAX_CHUNK * config.CHUNK_WIDTH),
+        )
+        chunks = []
+        try:
+            for x, column in columns:
+                chunks.append(ChunkData.from_column(x // config.CHUNK_WIDTH, column))
+                if len(chunks) >= self.batch_size or self._stopped.is_set():
+                    self._save(chunks)
+                    chunks = []
+                if self._stopped.is_set():
+                    break
+            self._save(chunks)
+        finally:
+            columns.close()
+        print(f"Generated world in {timer.stop()} seconds")
+
+    def _save(self, chunks: List[ChunkData]):
+        # Chunks are dropped once saved, the chunk loader reads them back when they are needed
+        self.store.save_new_chunks(chunks)
+        self.saved += len(chunks)
+
+    def stop(self):
+        """Stop generating, the chunks that are not saved yet are generated when the world is opened again"""
+        self._stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
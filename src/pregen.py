@@ -0,0 +1,91 @@
+"""
+Generate a range of chunks of a world ahead of time, in parallel, into the game's chunk storage.
+
+Chunks that are saved already are skipped, so an interrupted run picks up where it stopped when run again.
+Every chunk in the range is read back and checked at the end.
+
+    python src/pregen.py --min -500 --max 500 --seed 42 --workers 8
+"""
+import argparse
+from pathlib import Path
+import sys
+
+from misc.storage import ChunkFormatError, ChunkStore
+from misc.terrain import new_seed
+from utils import Timer
+from misc.worldgen import WorldGenerator
+import config
+
+
+def verify(store: ChunkStore, min_chunk: int, max_chunk: int) -> int:
+    """Read back every chunk in a range, returning the number of missing or damaged chunks"""
+    bad = 0
+    for index in range(min_chunk, max_chunk):
+        try:
+            chunk = store.load_chunk(index)
+        except ChunkFormatError as e:
+            print(f"Chunk {index}: {e}")
+            bad += 1
+            continue
+        if chunk is None:
+            print(f"Chunk {index}: missing")
+            bad += 1
+        elif chunk.index != index:
+            print(f"Chunk {index}: holds chunk {chunk.index}")
+            bad += 1
+    return bad
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seed", type=int, help="seed of a new world, random if not given")
+    parser.add_argument("--min", type=int, default=config.WORLD_MIN_CHUNK, help="index of the first chunk")
+    parser.add_argument("--max", type=int, default=config.WORLD_MAX_CHUNK, help="index after the last chunk")
+    parser.add_argument("--workers", type=int, help="generator processes, one per CPU if not given")
+    parser.add_argument("--data-dir", type=Path, default=config.DATA_DIR, help="directory of the world")
+    args = parser.parse_args(argv)
+    if args.max <= args.min:
+        parser.error("--max has to be larger than --min")
+
+    store = ChunkStore(args.data_dir)
+    seed = store.load_seed()
+    if seed is None:
+        seed = args.seed if args.seed is not None else new_seed()
+        store.save_seed(seed)
+    elif args.seed is not None and args.seed != seed:
+        parser.error(f"the world in {args.data_dir} has seed {seed}")
+
+    generator = WorldGenerator(store, seed, center_chunk=args.min, workers=args.workers,
+                               min_chunk=args.min, max_chunk=args.max)
+    skipped = generator.saved
+    print(f"Seed {seed}, chunks {args.min} to {args.max - 1}, {skipped} of {generator.total} saved already")
+
+    timer = Timer("pregen")
+    if not generator.done:
+        generator.start()
+    try:
+        while generator.thread.is_alive():
+            generator.thread.join(1)
+            elapsed = timer.stop()
+            rate = (generator.saved - skipped) / elapsed
+            eta = (generator.total - generator.saved) / rate if rate else float("inf")
+            print(f"{generator.saved}/{generator.total} chunks ({generator.progress:.0%}), "
+                  f"{rate:.1f} chunks/s, ETA {eta:.0f}s")
+    except KeyboardInterrupt:
+        print("Stopping, run again to continue")
+        generator.stop()
+        store.close()
+        return 1
+
+    print("Verifying")
+    bad = verify(store, args.min, args.max)
+    store.close()
+    if bad:
+        print(f"{bad} chunks are missing or damaged")
+        return 1
+    print(f"Generated {generator.saved - skipped} chunks in {timer.stop():.1f} seconds")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,8 +20,8 @@ class Timer:
 
 
 class TArray:
-    def __init__(self, arr: Optional[np.NDarray[np.int_]] = None, info: int = None):
-        self.arr = arr or {}
+    def __init__(self, arr: Optional[npt.NDArray[np.int_]] = None, info: int = None):
+        self.arr = arr if arr is not None else {}
         self.info = info
         self.adv_info = {}
 
@@ -29,4 +29,4 @@ class TArray:
         self.arr.__setitem__(key, value)
 
     def __getitem__(self, item):
-        self.arr.__getitem__(item)
+        return self.arr.__getitem__(item)
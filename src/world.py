@@ -1,31 +1,40 @@
-import gzip
-import pickle
 from collections import deque
-from math import atan, pi
+from concurrent.futures import ProcessPoolExecutor
+from math import atan, ceil, pi
+import multiprocessing
 import time
-from typing import Optional, Tuple, Set
+from typing import Dict, List, Optional, Tuple, Set, Union
 import threading
 from queue import Empty, Queue
 
 import arcade
+import numpy as np
 from entities.player import Player, PlayerSpriteList
-from block.block import Block
+from block.block import SKY_COLOR
+from misc.cache import ChunkCache
 from misc.camera import CustomCamera
-from misc.terrain import gen_world
+from misc.terrain import column_biome, gen_column, new_seed
 from utils import Timer
-from misc.chunk import HorizontalChunk
+from misc.chunk import NEIGHBOUR_OFFSETS, NEIGHBOURS, BlockAt, BlockEdit, HorizontalChunk, world_to_tile
+from misc.physics import GridPhysicsEngine
+from misc.renderer import TileRenderer
+from misc.request_queue import ChunkRequest, ChunkRequestQueue
+from misc.storage import ChunkFormatError, ChunkStore, ChunkWriter
+from misc.worldgen import WorldGenerator
 import config
 
 
 class World:
 
-    def __init__(self, *, screen_size: Tuple, name: str) -> None:
+    def __init__(self, *, screen_size: Tuple, name: str, seed: Optional[int] = config.WORLD_SEED) -> None:
         """
         :param screen_size: Size of the screen
         :param str name: Name of the world
+        :param seed: Seed for generating a new world, random if None. Existing worlds keep their seed.
         """
         self._screen_size = screen_size
         self._name = name
+        self._seed = seed
         self._player_default_x = 20 * 8  # 8 block to the right on the first chunk
         self._player_default_y = 20 * 210  # 210 chunks up
 
@@ -44,43 +53,70 @@ class World:
         )
         self._player_list: PlayerSpriteList = PlayerSpriteList(self._player_sprite)
 
-        # Initial physics engine with no chunks
-        self._physics_engine: arcade.PhysicsEnginePlatformer = arcade.PhysicsEnginePlatformer(
-            player_sprite=self._player_sprite,
-            walls=[],
-            gravity_constant=config.GRAVITY,
-        )
+        # Physics engine colliding with the blocks of loaded chunks
+        self._physics_engine = GridPhysicsEngine(self._player_sprite, self.is_solid, gravity_constant=config.GRAVITY)
         self._player_sprite.physics_engine = self._physics_engine
 
-        # All chunks
-        self._whole_world: dict = dict()
+        self._chunk_store = ChunkStore(config.DATA_DIR, chunk_type=HorizontalChunk)
+        # Chunks in memory
+        self._chunks = ChunkCache()
         # Visible chunks
         self._active_chunks: deque = deque()
 
         self.camera = CustomCamera(*self._screen_size)
+        self._tile_renderer: Optional[TileRenderer] = None
+        if config.TILE_RENDERER:
+            self._tile_renderer = TileRenderer(arcade.get_window().ctx)
 
         # Chunk loader
-        self._chunk_loader = ChunkLoader()
+        # The tile renderer draws chunks from their data, only the sprite renderer needs block sprites
+        self._chunk_loader = ChunkLoader(self._chunk_store, sprites=self._tile_renderer is None)
+        # Saves edited chunks in the background
+        self._chunk_writer = ChunkWriter(self._chunk_store)
+        # Generates and saves the chunks of a new world, created by setup_world
+        self._world_generator: Optional[WorldGenerator] = None
         self._requested_chunks: Set[int] = set()  # Keep track of requested chunks
+        self._pending_uploads: deque = deque()  # Chunks taken in but not sent to the GPU yet
+        self.frames_over_budget = 0  # Frames where taking in chunks took longer than CHUNK_FRAME_BUDGET_MS
+        self._prefetched_chunks: Set[int] = set()  # Chunks requested ahead of the player
+        self._frame_time = 1 / 60  # Smoothed seconds between updates
+        self._last_update: Optional[float] = None
+
+    @property
+    def seed(self) -> Optional[int]:
+        return self._seed
 
     @property
     def player(self) -> Player:
         return self._player_sprite
 
     def draw(self):
-        arcade.set_background_color(arcade.color.AMAZON)
+        if config.SPARSE_SPRITES and not self._tile_renderer:
+            arcade.set_background_color(SKY_COLOR)
+        else:
+            arcade.set_background_color(arcade.color.AMAZON)
         self.camera.use()
 
-        for chunk in self._active_chunks:
-            chunk.draw()
+        if self._tile_renderer:
+            self._tile_renderer.draw(self._active_chunks)
+        else:
+            for chunk in self._active_chunks:
+                chunk.draw()
 
         self._player_list.draw(pixelated=True)
         self.debug_draw_chunks()
 
     def update(self):
         """Called every frame to update the world state"""
+        now = time.perf_counter()
+        if self._last_update is not None:
+            self._frame_time += config.TIME_SMOOTHING * (now - self._last_update - self._frame_time)
+        self._last_update = now
+
         self.camera.center_camera_to_player(self._player_sprite)
         self.update_visible_chunks()
+        self.prefetch_chunks()
+        self.update_requests()
         self.process_new_chunks()
 
         if self._player_sprite.center_y < -100:
@@ -90,17 +126,72 @@ class World:
         self._player_list.update_list()
 
     def create(self):
-        """Create the initial world state"""
+        """Create the initial world state, generating a new world in the background"""
         self.setup_world()
+        self._chunk_writer.start()
+
+    @property
+    def generation_progress(self) -> float:
+        """Part of the world that is generated and saved, from 0 to 1"""
+        return self._world_generator.progress if self._world_generator else 0.0
+
+    def close(self):
+        """Stop the background threads and write the edit journal into the chunks, call before exiting"""
+        if self._world_generator:
+            self._world_generator.stop()
+        self._chunk_writer.stop()
+        self._chunk_loader.close()
+        self._chunk_store.close()
 
     def process_new_chunks(self):
+        """Take in loaded chunks and upload them to the GPU until the frame's chunk budget is spent"""
         # Get loaded chunks from threaded chunk loader
         self._chunk_loader.start()
-        new_chunks = self._chunk_loader.get_loaded_chunks(max_results=1)
-        for chunk in new_chunks:
+        budget = config.CHUNK_FRAME_BUDGET_MS / 1000
+        timer = Timer("process_chunks")
+        while timer.stop() < budget:
+            # Upload the chunks taken in so far before taking in more
+            if self._pending_uploads:
+                self.upload_chunk(self._pending_uploads.popleft())
+                continue
+
+            # Chunks that failed to load are requested again
+            for chunk_id in self._chunk_loader.get_failed_chunks():
+                self._requested_chunks.discard(chunk_id)
+
+            new_chunks = self._chunk_loader.get_loaded_chunks(max_results=1)
+            if not new_chunks:
+                break
+            chunk = new_chunks[0]
             print("New chunk data processed", type(chunk))
+            if chunk.index not in self._requested_chunks:
+                # Cancelled while it was loading
+                if self._chunks.get(chunk.index) is not chunk:
+                    chunk.release_sprites()
+                continue
             self._requested_chunks.remove(chunk.index)
-            self._whole_world[chunk.index] = chunk
+            self.add_chunk(chunk)
+            self._pending_uploads.append(chunk)
+
+        if timer.stop() > budget:
+            self.frames_over_budget += 1
+
+    def upload_chunk(self, chunk: HorizontalChunk):
+        """Send a chunk to the GPU ahead of drawing it"""
+        if self._chunks.get(chunk.index) is not chunk:
+            return
+        if self._tile_renderer:
+            self._tile_renderer.upload(chunk)
+        else:
+            chunk.initialize_sprites()
+
+    def add_chunk(self, chunk: HorizontalChunk):
+        """Keep a chunk in memory, evicting the chunks that were not visible for the longest time"""
+        keep = self._requested_chunks | {active.index for active in self._active_chunks}
+        for evicted in self._chunks.add(chunk, keep=keep):
+            print("Evicted chunk", evicted.index)
+            if self._tile_renderer:
+                self._tile_renderer.release(evicted)
 
     def request_chunk(self, chunk_id: int):
         """Request a new chunk"""
@@ -109,9 +200,68 @@ class World:
             return
 
         print("Requesting new chunk", chunk_id)
-        self._chunk_loader.queue_in.put(chunk_id)
+        # Chunks still in memory only need their sprites made again
+        chunk = self._chunks.get(chunk_id)
+        if chunk is None:
+            self._chunks.record_miss(chunk_id)
+        self._chunk_loader.request(chunk if chunk is not None else chunk_id, self._chunk_priority(chunk_id))
         self._requested_chunks.add(chunk_id)
 
+    def _chunk_priority(self, chunk_id: int) -> int:
+        # Chunks closest to the player load first
+        return abs(chunk_id - self._player_sprite.chunk)
+
+    def cancel_chunk(self, chunk_id: int):
+        """Cancel a chunk request that is no longer needed"""
+        if chunk_id in self._requested_chunks:
+            print("Cancelling chunk", chunk_id)
+            self._chunk_loader.cancel(chunk_id)
+            self._requested_chunks.remove(chunk_id)
+
+    def update_requests(self):
+        """Order the chunk requests by the player's current position and cancel the ones out of reach"""
+        player_chunk = self._player_sprite.chunk
+        reach = ceil(config.VISIBLE_RANGE_MAX / config.CHUNK_WIDTH) + 1 + config.PREFETCH_LOOKAHEAD
+        for chunk_id in list(self._requested_chunks):
+            if abs(chunk_id - player_chunk) > reach:
+                self.cancel_chunk(chunk_id)
+        self._chunk_loader.requests.reprioritize(self._chunk_priority)
+
+    def prefetch_chunks(self):
+        """
+        Request the chunks ahead of the player that it would reach before they could be loaded on demand,
+        and cancel the requests for chunks that are no longer ahead of it
+        """
+        wanted = set()
+        speed = self._player_sprite.change_x
+        if speed and self._active_chunks:
+            # Seconds to load the chunks already waiting and the next one, and the pixels moved meanwhile
+            load_time = self._chunk_loader.load_time * (len(self._requested_chunks) + 1) * config.PREFETCH_MARGIN
+            distance = abs(speed) / self._frame_time * load_time
+            ahead = min(ceil(distance / config.CHUNK_WIDTH_PIXELS), config.PREFETCH_LOOKAHEAD)
+
+            step = 1 if speed > 0 else -1
+            edge = self._active_chunks[-1 if step > 0 else 0].index
+            wanted = {edge + step * i for i in range(1, ahead + 1)}
+
+        for index in wanted - self._prefetched_chunks:
+            if not self._is_ready(self._chunks.get(index)):
+                self.request_chunk(index)
+
+        # Keep the chunks right next to the visible chunks, update_visible_chunks asks for them anyway
+        if self._active_chunks:
+            needed = range(self._active_chunks[0].index - 1, self._active_chunks[-1].index + 2)
+        else:
+            needed = range(self._player_sprite.chunk, self._player_sprite.chunk + 1)
+        for index in self._prefetched_chunks - wanted:
+            if index not in needed:
+                self.cancel_chunk(index)
+        self._prefetched_chunks = wanted
+
+    def _is_ready(self, chunk: Optional[HorizontalChunk]) -> bool:
+        # Chunks in memory can be drawn right away by the tile renderer, the sprite renderer needs their sprites
+        return chunk is not None and (self._tile_renderer is not None or chunk.has_sprites)
+
     def update_visible_chunks(self) -> Tuple[bool, bool]:
         """Detect and update visible chunks"""
         changed = False  # Did visible chunks change?
@@ -119,13 +269,20 @@ class World:
 
         # If we have no active chunks, add the chunk the player is located in
         if not self._active_chunks:
-            chunk = self._whole_world.get(self._player_sprite.chunk)
+            chunk = self._chunks.get(self._player_sprite.chunk)
             # If the player is not located in a chunk we have nothing to do
-            if not chunk:
-                self.request_chunk(self._player_sprite.chunk)
+            if not self._is_ready(chunk):
+                # After spawning or teleporting, load every chunk in view at the same time
+                view_dist = config.VISIBLE_RANGE_MAX * config.SPRITE_PIXEL_SIZE
+                first, last = world_to_tile(self._player_sprite.center_x - view_dist, 0)[0], \
+                    world_to_tile(self._player_sprite.center_x + view_dist, 0)[0]
+                for index in range(first // config.CHUNK_WIDTH, last // config.CHUNK_WIDTH + 1):
+                    if not self._is_ready(self._chunks.get(index)):
+                        self.request_chunk(index)
                 return False, False
 
             self._active_chunks.append(chunk)
+            self._chunks.record_hit(chunk.index)
             changed = True
 
         player_x = self._player_sprite.center_x
@@ -134,8 +291,8 @@ class World:
         # Fill visible chunks from left side
         while self._active_chunks[0].is_visible(player_x, view_dist):
             index = self._active_chunks[0].index - 1
-            new_chunk = self._whole_world.get(index)
-            if not new_chunk:
+            new_chunk = self._chunks.get(index)
+            if not self._is_ready(new_chunk):
                 self.request_chunk(index)
                 visible_loaded = False
                 break
@@ -143,13 +300,14 @@ class World:
                 break
 
             self._active_chunks.appendleft(new_chunk)
+            self._chunks.record_hit(index)
             changed = True
 
         # Fill visible chunks from right side
         while self._active_chunks[-1].is_visible(player_x, view_dist):
             index = self._active_chunks[-1].index + 1
-            new_chunk = self._whole_world.get(index)
-            if not new_chunk:
+            new_chunk = self._chunks.get(index)
+            if not self._is_ready(new_chunk):
                 self.request_chunk(index)
                 visible_loaded = False
                 break
@@ -157,6 +315,7 @@ class World:
                 break
 
             self._active_chunks.append(new_chunk)
+            self._chunks.record_hit(index)
             changed = True
 
         # Remove invisible chunks from left side
@@ -169,38 +328,38 @@ class World:
             chunk = self._active_chunks.pop()
             changed = True
 
-        # Update chunks for the physics engine
+        # Visible chunks are evicted last
+        for chunk in self._active_chunks:
+            self._chunks.touch(chunk.index)
+
         if changed:
-            self._physics_engine.walls = [chunk.spritelist for chunk in self._active_chunks]
+            self.release_distant_sprites()
 
         return visible_loaded, changed
 
-    def setup_world(self) -> None:
-        config.DATA_DIR.mkdir(exist_ok=True)
+    def release_distant_sprites(self):
+        """Return the block sprites of chunks far away from the player to the block pool"""
+        player_chunk = self._player_sprite.chunk
+        for chunk in self._chunks.values():
+            if (chunk.has_sprites and abs(chunk.index - player_chunk) > config.SPRITE_RELEASE_DISTANCE
+                    and chunk.index not in self._prefetched_chunks):
+                chunk.release_sprites()
 
-        if not (config.DATA_DIR / f"pickle{pickle.format_version}_0.pickle").exists():
+    def setup_world(self) -> None:
+        stored_seed = self._chunk_store.load_seed()
+        if stored_seed is not None:
+            self._seed = stored_seed
+        else:
+            if self._seed is None:
+                self._seed = new_seed()
+            self._chunk_store.save_seed(self._seed)
+        # Chunks outside the generated world are generated with the world seed when first loaded
+        self._chunk_loader.seed = self._seed
+
+        self._world_generator = WorldGenerator(self._chunk_store, self._seed, center_chunk=self._player_sprite.chunk)
+        if not self._world_generator.done:
             print("World not generated. Generating ...")
-            timer = Timer("world_gen")
-
-            # Create empty chunks
-            for n in range(-31, 31):
-                self._whole_world[n] = HorizontalChunk(n * 16, n)
-
-            world = gen_world(-496, 496, config.HEIGHT_MIN, config.HEIGHT_MIN + 320)
-            for k, chunk_data in world.items():
-                n = int(k[1] / 16)
-                self._whole_world[n]['setter'] = chunk_data
-
-            print(f"Generated world in {timer.stop()} seconds")
-
-            print("Saving world")
-            timer = Timer("world_save")
-            for n, chunk in self._whole_world.items():
-                with gzip.open(config.DATA_DIR / f"pickle{pickle.format_version}_{n}.pickle", "wb") as fd:
-                    pickle.dump(chunk.data, fd)
-                    chunk.make_sprite_list()
-
-            print(f"Saved wold in {timer.stop()} seconds")
+            self._world_generator.start()
 
     def debug_draw_chunks(self):
         """Draw chunk borders with lines"""
@@ -222,35 +381,88 @@ class World:
 
     def get_chunk_at_world_position(self, x, y) -> Optional[HorizontalChunk]:
         """Get a chunk at a wold position"""
-        return self._whole_world.get((x + config.SPRITE_PIXEL_SIZE / 2) // 320)
+        return self._chunks.get(world_to_tile(x, y)[0] // config.CHUNK_WIDTH)
+
+    def is_solid(self, tile_x: int, tile_y: int) -> bool:
+        """Whether the block at a tile position can't be moved through. Chunks that are not loaded yet are solid."""
+        if not 0 <= tile_y < config.CHUNK_HEIGHT:
+            return False
+        chunk = self._chunks.get(tile_x // config.CHUNK_WIDTH)
+        return chunk is None or chunk.data[tile_x % config.CHUNK_WIDTH, tile_y] > 129
+
+    def get_block_at_world_position(self, x, y) -> Optional[BlockAt]:
+        """Get the block at a world position from chunk storage, None outside the loaded chunks"""
+        tile_x, tile_y = world_to_tile(x, y)
+        chunk = self._chunks.get(tile_x // config.CHUNK_WIDTH)
+        if not chunk or not 0 <= tile_y < config.CHUNK_HEIGHT:
+            return None
+        return chunk.block_at(tile_x % config.CHUNK_WIDTH, tile_y)
 
-    def get_block_at_world_position(self, x, y) -> Optional[Block]:
-        """Get a block from a world position"""
-        chunk = self.get_chunk_at_world_position(x, y)
-        if not chunk:
+    def get_block_id(self, tile_x: int, tile_y: int) -> Optional[int]:
+        """Block id at a tile position, None outside the loaded chunks"""
+        chunk = self._chunks.get(tile_x // config.CHUNK_WIDTH)
+        if not chunk or not 0 <= tile_y < config.CHUNK_HEIGHT:
             return None
+        return int(chunk.data[tile_x % config.CHUNK_WIDTH, tile_y])
 
-        blocks = arcade.get_sprites_at_point(point=(x, y), sprite_list=chunk.spritelist)
-        if blocks:
-            return blocks[0]
+    def get_neighbouring_blocks(self, block: BlockAt) -> Dict[str, Optional[int]]:
+        """Solid neighbours of a block by direction across chunk borders, None for air and unloaded chunks"""
+        ret = {}
+        for direction, (x, y) in NEIGHBOURS.items():
+            block_id = self.get_block_id(block.tile_x + x, block.y + y)
+            ret[direction] = block_id if block_id is not None and block_id > 129 else None
+        return ret
 
-        return None
+    def get_block_ids(self, tiles_x, tiles_y, offsets: np.ndarray = NEIGHBOUR_OFFSETS) -> np.ndarray:
+        """
+        Block ids around many tiles at once, across chunk borders.
+
+        :param tiles_x: Tile x positions
+        :param tiles_y: Tile y positions
+        :param offsets: (dx, dy) offsets to read around every tile, like NEIGHBOUR_OFFSETS or stencil(radius)
+        :return: (tiles, offsets) array of block ids, 0 outside the loaded chunks
+        """
+        xs = np.asarray(tiles_x)[:, None] + offsets[:, 0]
+        ys = np.asarray(tiles_y)[:, None] + offsets[:, 1]
+        shape = xs.shape
+        ids = np.zeros(xs.size, dtype=np.uint8)
+        xs, ys = xs.ravel(), ys.ravel()
+        # Group the positions by chunk so every chunk is only visited once
+        inside = np.flatnonzero((ys >= 0) & (ys < config.CHUNK_HEIGHT))
+        chunk_ids = xs[inside] // config.CHUNK_WIDTH
+        order = np.argsort(chunk_ids, kind="stable")
+        indices, starts = np.unique(chunk_ids[order], return_index=True)
+        for index, group in zip(indices, np.split(inside[order], starts[1:])):
+            chunk = self._chunks.get(int(index))
+            if chunk is not None:
+                ids[group] = chunk.data[xs[group] % config.CHUNK_WIDTH, ys[group]]
+        return ids.reshape(shape)
+
+    def neighbour_mask(self, tiles_x, tiles_y, offsets: np.ndarray = NEIGHBOUR_OFFSETS) -> np.ndarray:
+        """(tiles, offsets) mask of solid blocks around many tiles at once, see get_block_ids"""
+        return self.get_block_ids(tiles_x, tiles_y, offsets) > 129
 
     def place_block(self, x: int, y: int):
-        actual_x = config.SPRITE_PIXEL_SIZE * round(x / config.SPRITE_PIXEL_SIZE)
-        actual_y = config.SPRITE_PIXEL_SIZE * round(y / config.SPRITE_PIXEL_SIZE)
+        block = self.get_block_at_world_position(x, y)
+        if not block or block.solid:
+            return
         block_id = self._player_sprite.inventory.get_selected_item_id_and_remove()
         if not block_id:
             return
-        self._whole_world[((x + config.SPRITE_PIXEL_SIZE / 2) // 320)].add(actual_x, actual_y, block_id)
+        self._record_edit(block.chunk, block.chunk.add(block.center_x, block.center_y, block_id))
+
+    def remove_block(self, block: BlockAt):
+        self._record_edit(block.chunk, block.chunk.remove(block.x, block.y))
 
-    def remove_block(self, block: Block):
-        x = block.center_x
-        self._whole_world[((x + config.SPRITE_PIXEL_SIZE / 2) // 320)].remove(block)
+    def _record_edit(self, chunk: HorizontalChunk, edit: Optional[BlockEdit]):
+        if edit is None:
+            return
+        # The journal keeps the edit, compaction writes it into the chunk's region
+        self._chunk_store.journal.append(edit)
 
     @property
-    def whole_world(self):
-        return self._whole_world
+    def whole_world(self) -> ChunkCache:
+        return self._chunks
 
     def dir_of_mouse_from_player(self, mouse_x, mouse_y):
         player = self._player_sprite
@@ -290,56 +502,168 @@ class World:
 
         return direction
 
-    def block_break_check(self, block: Block, mouse_x: int, mouse_y: int) -> bool:
+    def block_break_check(self, block: BlockAt, mouse_x: int, mouse_y: int) -> bool:
         if not self._player_sprite.distance_to_block(block) < config.PLAYER_BLOCK_REACH:
             return False
         reverse = {"S": "N", "N": "S", "SW": "NE", "NE": "SW", "E": "W", "W": "E", "SE": "NW", "NW": "SE"}
         direction = self.dir_of_mouse_from_player(mouse_x, mouse_y)
-        block_neighbours = self.get_chunk_at_world_position(block.center_x, block.center_y)\
-            .get_neighbouring_blocks(block)
+        block_neighbours = self.get_neighbouring_blocks(block)
         if block_neighbours[reverse[direction]]:
             return False
         return True
 
 
 class ChunkLoader:
-    def __init__(self):
+    """
+    Loads chunks in two stages, each with its own worker threads.
+
+    Load workers read chunks from storage, or generate them on a process pool, and pass them on to the sprite
+    workers through a queue holding at most `depth` chunks. Sprite workers make the block sprites.
+    Without sprites, the load workers hand the chunks out directly.
+    """
+
+    def __init__(self, store: ChunkStore, seed: Optional[int] = None, *, sprites: bool = True,
+                 load_workers: int = config.CHUNK_LOAD_WORKERS,
+                 sprite_workers: int = config.CHUNK_SPRITE_WORKERS,
+                 depth: int = config.CHUNK_PIPELINE_DEPTH,
+                 gen_workers: Optional[int] = config.CHUNK_GEN_WORKERS):
+        """
+        :param store: Storage the chunks are loaded from
+        :param seed: World seed for generating chunks that were never saved
+        :param sprites: Make the block sprites of the chunks, not needed with the tile renderer
+        :param load_workers: Threads reading and generating chunks
+        :param sprite_workers: Threads making block sprites
+        :param depth: Chunks waiting for each sprite worker before the load workers wait
+        :param gen_workers: Processes generating chunks, one per CPU if None
+        """
+        self.store = store
+        self.seed = seed
+        self._gen_workers = gen_workers
+        self._generator: Optional[ProcessPoolExecutor] = None
+        self._generator_lock = threading.Lock()
+
         # Queue for incoming and completed work
-        self.queue_in = Queue(maxsize=-1)
+        self.requests = ChunkRequestQueue()
+        # One queue per sprite worker, a chunk always goes to the same worker so it never gets sprites twice
+        self._loaded = [Queue(maxsize=depth) for _ in range(sprite_workers if sprites else 0)]
         self.queue_out = Queue(maxsize=-1)
+        # Ids of the chunks that could not be loaded
+        self.queue_failed = Queue(maxsize=-1)
 
-        # Run as daemon thread. This will terminate with the application.
-        self.thread = threading.Thread(target=self._run, daemon=True)
+        # Run as daemon threads. These will terminate with the application.
+        self.threads = [
+            threading.Thread(target=self._run_loader, daemon=True) for _ in range(load_workers)
+        ] + [
+            threading.Thread(target=self._run_sprites, args=(loaded,), daemon=True) for loaded in self._loaded
+        ]
+        self._started = False
 
     def start(self):
-        """Start the thread if not already started"""
-        if not self.thread.is_alive():
-            print("Starting chunk loader thread")
-            self.thread.start()
+        """Start the threads if not already started"""
+        if not self._started:
+            self._started = True
+            print("Starting chunk loader threads")
+            for thread in self.threads:
+                thread.start()
+
+    def close(self):
+        """Stop the generator processes"""
+        with self._generator_lock:
+            if self._generator:
+                self._generator.shutdown(wait=False, cancel_futures=True)
+                self._generator = None
 
-    def _run(self):
-        while True:
-            # Wait for a new chunk loading request
-            chunk_id = self.queue_in.get(block=True)
-            # Load the chunk here..
-            chunk_timer = Timer("chunk_load")
-            with gzip.open(config.DATA_DIR / f"pickle{pickle.format_version}_{chunk_id}.pickle") as f:
-                chunk = HorizontalChunk(chunk_id * 16, chunk_id, pickle.load(f))
-            print("Loaded chunk in", chunk_timer.stop())
+    @property
+    def load_time(self) -> float:
+        """Smoothed seconds to load a chunk and make its sprites"""
+        return self.requests.service_time
 
-            # Spread load over more time
-            sp_timer = Timer("chunk_load")
-            i = 0
-            for _ in chunk.make_sprite_list():
-                if i == 50:
-                    time.sleep(0.001)
-                    i = 0
-                i += 1
-            print("Make spritelist in", sp_timer.stop())
+    def request(self, request: Union[int, HorizontalChunk], priority: float = 0):
+        """Queue a chunk id to load, or a chunk in memory to make the sprites for. Lower priorities load first."""
+        chunk_id = request.index if isinstance(request, HorizontalChunk) else request
+        self.requests.put(chunk_id, request, priority)
 
-            self.queue_out.put(chunk)
+    def cancel(self, chunk_id: int) -> bool:
+        """Drop a queued request, False if it is already loading or done"""
+        return self.requests.cancel(chunk_id)
 
-            print(f"Loaded chunk {chunk_id} in {chunk_timer.stop()}")
+    def _run_loader(self):
+        while True:
+            # Wait for the most important chunk loading request
+            request = self.requests.get()
+            try:
+                chunk = self._load(request)
+            except Exception as e:
+                # Keep the thread alive, the world requests the chunk again
+                print(f"Failed to load chunk {request.chunk_id}: {e!r}")
+                self.requests.done(request)
+                self.queue_failed.put(request.chunk_id)
+                continue
+            if self._loaded:
+                self._loaded[request.chunk_id % len(self._loaded)].put((request, chunk))
+            else:
+                self._finish(request, chunk)
+
+    def _load(self, request: ChunkRequest) -> HorizontalChunk:
+        if isinstance(request.item, HorizontalChunk):
+            # Chunk is in memory, only the sprites are missing
+            return request.item
+
+        chunk_timer = Timer("chunk_load")
+        try:
+            chunk = self.store.load_edited_chunk(request.chunk_id)
+        except ChunkFormatError as e:
+            # Generating the chunk again replaces the damaged copy, the journal still has its edits
+            print(f"Chunk {request.chunk_id} is damaged ({e}), generating it again")
+            chunk = self.generate_chunk(request.chunk_id)
+            chunk.replay(self.store.journal.edits(request.chunk_id))
+            return chunk
+        if chunk is None:
+            chunk = self.generate_chunk(request.chunk_id)
+            print("Generated chunk in", chunk_timer.stop())
+        else:
+            print("Loaded chunk in", chunk_timer.stop())
+        return chunk
+
+    def _run_sprites(self, loaded: Queue):
+        while True:
+            request, chunk = loaded.get()
+            if not chunk.has_sprites:
+                sp_timer = Timer("chunk_load")
+                i = 0
+                for _ in chunk.make_sprite_list():
+                    # Let the main thread run in between
+                    if i == 50:
+                        time.sleep(0)
+                        i = 0
+                    i += 1
+                print("Make spritelist in", sp_timer.stop())
+            self._finish(request, chunk)
+
+    def _finish(self, request: ChunkRequest, chunk: HorizontalChunk):
+        self.queue_out.put(chunk)
+        self.requests.done(request)
+        print(f"Loaded chunk {request.chunk_id} in {request.service_time}, waited {request.wait_time}")
+
+    def generate_chunk(self, chunk_id: int) -> HorizontalChunk:
+        """Generate a chunk that is not on disk yet and save it"""
+        with self._generator_lock:
+            if self._generator is None:
+                # Started from a loader thread while other threads hold locks, a forked child could inherit one held
+                self._generator = ProcessPoolExecutor(max_workers=self._gen_workers,
+                                                      mp_context=multiprocessing.get_context("spawn"))
+            generator = self._generator
+
+        x = chunk_id * config.CHUNK_WIDTH
+        biome = column_biome(
+            self.seed, x, config.WORLD_MIN_CHUNK * config.CHUNK_WIDTH, config.WORLD_MAX_CHUNK * config.CHUNK_WIDTH
+        )
+        column = generator.submit(
+            gen_column, self.seed, x, biome, config.HEIGHT_MIN, config.HEIGHT_MIN + config.CHUNK_HEIGHT
+        ).result()
+        chunk = HorizontalChunk.from_column(chunk_id, column)
+        self.store.save_chunk(chunk)
+        return chunk
 
     def get_loaded_chunks(self, max_results=1):
         chunks = deque()
@@ -352,3 +676,12 @@ class ChunkLoader:
                 break
 
         return chunks
+
+    def get_failed_chunks(self) -> List[int]:
+        """Take the ids of the chunks that failed to load since the last call"""
+        failed = []
+        while True:
+            try:
+                failed.append(self.queue_failed.get(block=False))
+            except Empty:
+                return failed